@@ -4,19 +4,41 @@ Serves the web interface and handles file processing requests.
 Integrates OCR, AI structuring, and markdown enhancement.
 """
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Request, request, jsonify, render_template_string, Response
 import os
+import json
 import base64
 import requests
 import subprocess
 import sys
 from pathlib import Path
-import docx
-import PyPDF2
 from PIL import Image
-import mammoth
 import tempfile
 import re
+import logging
+import unicodedata
+import hashlib
+import threading
+import multiprocessing
+import time
+import io
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from jobs import Job, JobQueue, JobQueueFull
+from pipeline import Stage
+from scheduler import ModelScheduler
+from ollama_client import OllamaClient
+from image_prep import preprocess_for_ocr, image_dimensions, split_into_tiles, stitch_transcriptions
+from docx_extract import extract_docx
+from formats import UnsupportedFormat, sniff, kind_of
+from pdf_extract import (page_count, page_texts, iter_page_texts, iter_page_texts_sharded, render_page,
+                         render_page_base64, rendering_engine)
+from sandbox import Sandbox, ExtractionFailed
+from result_cache import ResultCache, cache_key
+from upload_store import UploadStore, UploadTooLarge, HashingSpool
+from resumable_uploads import UploadSessions, UnknownUpload, InvalidChunk, IncompleteUpload
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, NEED_DATA, Data, Epilogue, Field, File
 
 # === CONFIGURATION ===
 project_root = Path(__file__).parent
@@ -24,20 +46,194 @@ uploads_dir = project_root / "uploads"
 outputs_dir = project_root / "outputs"
 temp_dir = project_root / "temp"
 logs_dir = project_root / "logs"
+cache_dir = project_root / "cache"
 
 # Create required directories
-for folder in [uploads_dir, outputs_dir, temp_dir, logs_dir]:
+for folder in [uploads_dir, outputs_dir, temp_dir, logs_dir, cache_dir]:
     folder.mkdir(exist_ok=True)
 
-# Ollama config
-OLLAMA_HOST = "http://localhost:11434"
+# Ollama config (host, timeouts and retries come from the environment, see OllamaClient.from_env)
 VISION_MODEL = "qwen2.5vl:7b"   # For OCR (images)
 TEXT_MODEL = "phi3:mini"         #"phi3:mini"  #"qwen3:4b"         # For structuring notes
 TEMPERATURE = 0.1
+OCR_PROMPT_VERSION = "ocr-v1"      # Bump whenever the OCR prompt changes to invalidate cached transcriptions
+
+# Image preprocessing before OCR (EXIF rotation, grayscale, contrast, resolution cap)
+OCR_PREPROCESS = os.environ.get("NOTEBOT_OCR_PREPROCESS", "1") == "1"
+OCR_MAX_SIDE = int(os.environ.get("NOTEBOT_OCR_MAX_SIDE", 1600))         # Longest edge in pixels sent to the vision model
+OCR_JPEG_QUALITY = int(os.environ.get("NOTEBOT_OCR_JPEG_QUALITY", 85))
+
+# Scanned PDFs: pages with less text than this are rendered and sent through OCR
+PDF_MIN_PAGE_CHARS = int(os.environ.get("NOTEBOT_PDF_MIN_PAGE_CHARS", 20))
+PDF_OCR_DPI = int(os.environ.get("NOTEBOT_PDF_OCR_DPI", 200))
+
+# DOCX: "fast" streams document.xml (mammoth is still the fallback); "mammoth" always uses mammoth
+DOCX_ENGINE = os.environ.get("NOTEBOT_DOCX_ENGINE", "fast")
+
+# PyPDF2 is pure Python: long PDFs are split into page shards extracted in separate processes
+PDF_PROCESSES = int(os.environ.get("NOTEBOT_PDF_PROCESSES", os.cpu_count() or 1))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("NOTEBOT_PDF_PARALLEL_MIN_PAGES", 50))  # Smaller PDFs stay in-process
+PDF_SHARD_PAGES = int(os.environ.get("NOTEBOT_PDF_SHARD_PAGES", 10))                # Pages per worker task
+
+# Sandboxed extraction: parsers run in a child process with memory/CPU rlimits (POSIX) and a timeout
+SANDBOX_EXTRACTION = os.environ.get("NOTEBOT_SANDBOX", "1") == "1"
+SANDBOX_MEMORY_MB = int(os.environ.get("NOTEBOT_SANDBOX_MEMORY_MB", 1024))    # Address space per parser process
+SANDBOX_CPU_SECONDS = int(os.environ.get("NOTEBOT_SANDBOX_CPU_SECONDS", 120))  # CPU time per parser process
+SANDBOX_TIMEOUT = float(os.environ.get("NOTEBOT_SANDBOX_TIMEOUT", 180))       # Seconds without progress before the kill
+
+# Large PDFs are streamed page by page into the chunked structuring path
+PDF_STREAM_MIN_PAGES = int(os.environ.get("NOTEBOT_PDF_STREAM_MIN_PAGES", 40))
+PDF_STREAM_SCANNED_RUN = 4                                  # Scanned pages OCR'd and structured together
+
+# Tiled OCR for whiteboards and posters: tiles are OCR_MAX_SIDE square, so nothing is downsampled
+OCR_TILING = os.environ.get("NOTEBOT_OCR_TILING", "0") == "1"               # Default when the upload doesn't say
+OCR_TILE_TRIGGER = int(os.environ.get("NOTEBOT_OCR_TILE_TRIGGER", 2 * OCR_MAX_SIDE))  # Only tile images longer than this
+OCR_TILE_OVERLAP = float(os.environ.get("NOTEBOT_OCR_TILE_OVERLAP", 0.15))  # Fraction shared by neighbouring tiles
+
+# The web page downscales and re-encodes photos in the browser to the target from /api/image-target
+CLIENT_IMAGE_RESIZE = os.environ.get("NOTEBOT_CLIENT_IMAGE_RESIZE", "1") == "1"
+CLIENT_TILE_MAX_SIDE = int(os.environ.get("NOTEBOT_CLIENT_TILE_MAX_SIDE", 4 * OCR_MAX_SIDE))  # Kept for tiled OCR
+NUM_CTX = 8192
+NOTES_PROMPT_VERSION = "notes-v2"  # Bump whenever the structuring prompts change to invalidate cached notes
+CHARS_PER_TOKEN = 4                # Rough average for English text
+NOTES_OUTPUT_RESERVE = 2048        # Context tokens kept free for the model's answer
+CHUNK_TRIGGER_TOKENS = NUM_CTX - NOTES_OUTPUT_RESERVE - 512                   # Longer input is chunked (map-reduce)
+CHUNK_TOKENS = int(os.environ.get("NOTEBOT_CHUNK_TOKENS", 3000))            # Target size of each chunk
+
+# Background job queue config
+JOB_WORKERS = int(os.environ.get("NOTEBOT_JOB_WORKERS", 8))          # Batches in the pipeline at once
+JOB_MAX_PENDING = int(os.environ.get("NOTEBOT_JOB_MAX_PENDING", 50))  # Waiting batches before we answer 503
+JOB_TTL_SECONDS = int(os.environ.get("NOTEBOT_JOB_TTL", 3600))        # How long finished jobs stay pollable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("notebot")
+job_queue = JobQueue(workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, ttl=JOB_TTL_SECONDS)
+
+# Pipeline stage widths: extraction is CPU-bound, model calls are limited by the Ollama server
+EXTRACT_WORKERS = int(os.environ.get("NOTEBOT_EXTRACT_WORKERS", os.cpu_count() or 2))
+OLLAMA_NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", 1))  # Keep in step with the Ollama server setting
+OCR_WORKERS = int(os.environ.get("NOTEBOT_OCR_WORKERS", OLLAMA_NUM_PARALLEL))
+STRUCTURE_WORKERS = int(os.environ.get("NOTEBOT_STRUCTURE_WORKERS", OLLAMA_NUM_PARALLEL))
+PDF_STREAM_MAX_PENDING = 2 * OLLAMA_NUM_PARALLEL + 1  # Chunks of a streamed PDF queued ahead of the model
+PDF_STREAM_WORKERS = int(os.environ.get("NOTEBOT_PDF_STREAM_WORKERS", 2))  # Large PDFs streamed at once
+
+# Model-swap-aware scheduling: drain vision and text calls in batches instead of alternating
+MODEL_BATCH_LIMIT = int(os.environ.get("NOTEBOT_MODEL_BATCH", 8))       # Max calls in a row for one model while the other waits
+MODEL_LINGER_SECONDS = float(os.environ.get("NOTEBOT_MODEL_LINGER", 1.0))  # How long to hold a model for queued work
+PROBE_RESIDENT_MODELS = os.environ.get("NOTEBOT_PROBE_RESIDENT", "1") == "1"  # Ask /api/ps which model is loaded
+
+ollama = OllamaClient.from_env(pool_size=max(10, OLLAMA_NUM_PARALLEL * 2))
+
+
+def resident_models():
+    """Models Ollama currently holds in memory, per /api/ps."""
+    try:
+        return {model["name"] for model in ollama.ps()}
+    except Exception as e:
+        logger.warning(f"⚠️ Could not query loaded models: {e}")
+        return set()
+
+
+def model_backlog(model):
+    """Files queued for the stage that uses `model`, so the scheduler keeps it loaded for them."""
+    if model == VISION_MODEL:
+        return ocr_stage.queue_depth
+    if model == TEXT_MODEL:
+        return structure_stage.queue_depth
+    return 0
+
+
+# Sub-calls fanned out from one file (map-reduce chunks, pages, scanned PDF pages). They still
+# go through ollama_scheduler; this pool just keeps enough of them queued. A task on a pool must
+# never wait for work on the same pool, so OCR tiles (which a page task may wait for) get their own.
+fanout_pool = ThreadPoolExecutor(max_workers=OLLAMA_NUM_PARALLEL, thread_name_prefix="notebot-fanout")
+tile_pool = ThreadPoolExecutor(max_workers=OLLAMA_NUM_PARALLEL, thread_name_prefix="notebot-tiles")
+
+# Streaming a large PDF paces page reading to the model for the whole map phase; it runs here
+# so extract workers are free for other uploads once they have handed the PDF over.
+pdf_stream_pool = ThreadPoolExecutor(max_workers=PDF_STREAM_WORKERS, thread_name_prefix="notebot-pdf-stream")
+
+ollama_scheduler = ModelScheduler(
+    OLLAMA_NUM_PARALLEL,
+    max_batch=MODEL_BATCH_LIMIT,
+    linger=MODEL_LINGER_SECONDS,
+    pending=model_backlog,
+    resident=resident_models if PROBE_RESIDENT_MODELS else None,
+)
+
+extraction_sandbox = Sandbox(memory_mb=SANDBOX_MEMORY_MB, cpu_seconds=SANDBOX_CPU_SECONDS,
+                             timeout=SANDBOX_TIMEOUT)
+
+# Processes for sharded PDF text extraction; "spawn" because forking a threaded server is unsafe.
+# Sandboxed children start their own pool, within their limits, so this one is only for unsandboxed runs.
+pdf_pool = (ProcessPoolExecutor(max_workers=PDF_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+            if PDF_PROCESSES > 1 and not SANDBOX_EXTRACTION else None)
+# A sandboxed sharded run is PDF_PROCESSES + 1 processes, each with its own rlimits, so only one
+# runs at a time across the app; other large PDFs meanwhile are extracted in a single process.
+pdf_shard_slot = threading.BoundedSemaphore(1)
+
+# Shared across gunicorn workers via SQLite
+NOTES_CACHE_MAX_MB = int(os.environ.get("NOTEBOT_NOTES_CACHE_MB", 256))
+notes_cache = ResultCache(cache_dir / "notes.sqlite", max_bytes=NOTES_CACHE_MAX_MB * 1024 * 1024)
+OCR_CACHE_MAX_MB = int(os.environ.get("NOTEBOT_OCR_CACHE_MB", 128))
+OCR_CACHE_MAX_AGE_DAYS = float(os.environ.get("NOTEBOT_OCR_CACHE_DAYS", 30))
+ocr_cache = ResultCache(cache_dir / "ocr.sqlite", max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024,
+                        max_age=OCR_CACHE_MAX_AGE_DAYS * 24 * 3600)
+
+# Upload size limits: PDFs stream page by page, so they may be much larger than other files
+UPLOAD_MAX_MB = int(os.environ.get("NOTEBOT_UPLOAD_MAX_MB", 16))
+PDF_UPLOAD_MAX_MB = int(os.environ.get("NOTEBOT_PDF_UPLOAD_MAX_MB", 100))
+
+# Uploads are stored once per distinct content, under uploads/ab/cd/<sha256><ext>
+upload_store = UploadStore(uploads_dir)
+
+# Incremental multipart (?incremental=1): request body read size, and cap on each plain form field
+INCREMENTAL_READ_BYTES = 64 * 1024
+FORM_FIELD_MAX_BYTES = 64 * 1024
+
+# The web page uploads each file as its own request into one job, this many at a time. A request
+# holds a server thread only while its body arrives; progress comes back on one events stream.
+UPLOAD_CONCURRENCY = int(os.environ.get("NOTEBOT_UPLOAD_CONCURRENCY", 3))
+
+# Resumable uploads: chunk size offered to clients and how long unfinished sessions are kept
+UPLOAD_CHUNK_MB = int(os.environ.get("NOTEBOT_UPLOAD_CHUNK_MB", 4))
+UPLOAD_SESSION_TTL = int(os.environ.get("NOTEBOT_UPLOAD_SESSION_TTL", 24 * 3600))
+upload_sessions = UploadSessions(temp_dir / "sessions", ttl=UPLOAD_SESSION_TTL)
 
 # === FLASK APP ===
+class SpoolingRequest(Request):
+    """
+    Streams each uploaded file straight into a HashingSpool in temp_dir as
+    the multipart body is parsed, instead of Werkzeug's in-memory buffer.
+    Files are hashed and size-checked on arrival; spool files that were not
+    moved into the upload store are deleted when the request ends.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spools = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = HashingSpool(temp_dir, max_bytes=max(UPLOAD_MAX_MB, PDF_UPLOAD_MAX_MB) * 1024 * 1024)
+        self.spools.append(spool)
+        return spool
+
+    def close(self):
+        super().close()
+        for spool in self.spools:
+            spool.discard()
+
+
 app = Flask(__name__)
-app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max upload size
+app.request_class = SpoolingRequest
+app.config["MAX_CONTENT_LENGTH"] = max(UPLOAD_MAX_MB, PDF_UPLOAD_MAX_MB) * 1024 * 1024  # Whole request
+
+
+def upload_limit(kind):
+    """Largest accepted size in bytes for one uploaded file of extractor `kind`."""
+    if kind == "pdf":
+        return PDF_UPLOAD_MAX_MB * 1024 * 1024
+    return UPLOAD_MAX_MB * 1024 * 1024
 
 
 # === TEXT EXTRACTION FUNCTIONS ===
@@ -49,56 +245,158 @@ def extract_text_from_txt(filepath):
 
 def extract_text_from_docx(filepath):
     try:
-        with open(filepath, "rb") as f:
-            result = mammoth.extract_raw_text(f)
-            return result.value.strip()
+        return isolated(extract_docx, str(filepath), DOCX_ENGINE)
+    except ExtractionFailed:
+        raise
     except Exception as e:
         return f"[ERROR: Could not read DOCX] {str(e)}"
 
 def extract_text_from_pdf(filepath):
     try:
-        reader = PyPDF2.PdfReader(str(filepath))
-        return "\n".join([page.extract_text() or "" for page in reader.pages])
+        return "\n".join(isolated(page_texts, str(filepath)))
+    except ExtractionFailed:
+        raise
     except Exception as e:
         return f"[ERROR: Could not read PDF] {str(e)}"
 
-def image_to_text_ocr(image_path: Path) -> str:
-    """Use qwen2.5vl:7b to transcribe image to text."""
+def isolated(function, *args):
+    """Run a document parser in the extraction sandbox (when enabled), else in-process."""
+    if SANDBOX_EXTRACTION:
+        return extraction_sandbox.call(function, *args)
+    return function(*args)
+
+def isolated_stream(function, *args):
+    if SANDBOX_EXTRACTION:
+        return extraction_sandbox.stream(function, *args)
+    return function(*args)
+
+
+def render_pdf_page(path, index):
+    """Image bytes of one PDF page for OCR. Rasterising is native code and the most memory-hungry step, so it is sandboxed too."""
+    if SANDBOX_EXTRACTION:
+        return base64.b64decode(extraction_sandbox.call(render_page_base64, str(path), index, PDF_OCR_DPI))
+    return render_page(path, index, PDF_OCR_DPI)
+
+def ollama_generate(payload, on_token=None):
+    """
+    Call Ollama's /api/generate through the shared client and return the full
+    response text; `on_token` receives each fragment as it is generated.
+    At most OLLAMA_NUM_PARALLEL calls are in flight at once, and calls are
+    grouped by model by `ollama_scheduler` to avoid reload thrash.
+    """
+    with ollama_scheduler.slot(payload["model"]):
+        return ollama.generate(payload, on_token)
+
+
+OCR_PROMPT = (
+    "You are a precise OCR assistant.\n"
+    "Transcribe ALL visible text exactly as written.\n"
+    "- Preserve line breaks, punctuation, and formatting.\n"
+    "- Do NOT add explanations, headers, or commentary.\n"
+    "- Output ONLY the raw text."
+)
+
+
+def image_to_text_ocr(image_path: Path, on_token=None, stats=None, tile=False) -> str:
+    """
+    Use qwen2.5vl:7b to transcribe image to text.
+    Transcriptions are cached by image content, so re-uploads skip the vision model.
+    Images are shrunk by `preprocess_for_ocr` first; pass a dict as `stats`
+    to receive bytes saved and OCR latency for this image.
+    With `tile`, images larger than OCR_TILE_TRIGGER are read in overlapping tiles.
+    """
+    stats = {} if stats is None else stats
     try:
         img_bytes = image_path.read_bytes()
-        img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-
-        prompt = (
-            "You are a precise OCR assistant.\n"
-            "Transcribe ALL visible text exactly as written.\n"
-            "- Preserve line breaks, punctuation, and formatting.\n"
-            "- Do NOT add explanations, headers, or commentary.\n"
-            "- Output ONLY the raw text."
-        )
-
-        payload = {
-            "model": VISION_MODEL,
-            "prompt": prompt,
-            "images": [img_b64],
-            "stream": False,
-            "options": {"temperature": 0.0},
-        }
-
-        response = requests.post(f"{OLLAMA_HOST}/api/generate", json=payload, timeout=600)
-        response.raise_for_status()
-        return response.json().get("response", "").strip()
-
+        if tile and max(image_dimensions(img_bytes)) > OCR_TILE_TRIGGER:
+            return tiled_ocr(img_bytes, image_path.name, stats)
+        return ocr_image_bytes(img_bytes, image_path.name, on_token, stats)
     except Exception as e:
         return f"[OCR ERROR] {str(e)}"
 
-def text_to_project_notes(raw_text: str) -> str:
-    """
-    Uses a smart AI to turn raw notes into polished, insightful markdown.
-    Focuses on clarity, next steps, and professional tone.
-    """
+
+def ocr_image_bytes(img_bytes: bytes, name: str, on_token=None, stats=None) -> str:
+    """Transcribe one encoded image (cache, preprocessing, vision call). Raises on failure."""
+    stats = {} if stats is None else stats
+    key = cache_key(hashlib.sha256(img_bytes).hexdigest(), VISION_MODEL, OCR_PROMPT_VERSION,
+                    OCR_PREPROCESS and OCR_MAX_SIDE)
+    try:
+        cached = ocr_cache.get(key)
+    except Exception as e:
+        logger.warning(f"⚠️ OCR cache unavailable: {e}")
+        cached = None
+    if cached is not None:
+        logger.info(f"⚡ OCR cache hit: {name}")
+        stats["cache_hit"] = True
+        return cached
+
+    if OCR_PREPROCESS:
+        try:
+            img_bytes, prep_stats = preprocess_for_ocr(img_bytes, OCR_MAX_SIDE, OCR_JPEG_QUALITY)
+            stats.update(prep_stats)
+        except Exception as e:
+            logger.warning(f"⚠️ Image preprocessing failed, sending original: {e}")
+
+    img_b64 = base64.b64encode(img_bytes).decode("utf-8")
+
+    payload = {
+        "model": VISION_MODEL,
+        "prompt": OCR_PROMPT,
+        "images": [img_b64],
+        "options": {"temperature": 0.0},
+    }
+
+    started = time.perf_counter()
+    text = ollama_generate(payload, on_token).strip()
+    stats["ocr_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"👁️ OCR {name}: {stats.get('bytes_saved', 0)} bytes saved, {stats['ocr_seconds']}s")
     try:
-        prompt = f"""<|im_start|>system
-You are a senior project assistant with 10+ years of experience.
+        ocr_cache.set(key, text)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not cache OCR result: {e}")
+    return text
+
+
+def tiled_ocr(img_bytes: bytes, name: str, stats: dict) -> str:
+    """OCR overlapping tiles of a large image concurrently and stitch the transcriptions."""
+    started = time.perf_counter()
+    columns = split_into_tiles(img_bytes, OCR_MAX_SIDE, OCR_TILE_OVERLAP)
+    tiles = [(column, row, tile) for column, tiles in enumerate(columns) for row, tile in enumerate(tiles)]
+    logger.info(f"🧩 Tiled OCR {name}: {len(columns)} columns, {len(tiles)} tiles")
+
+    tile_stats = [{} for _ in tiles]
+    texts = list(tile_pool.map(
+        lambda item, tile_stat: ocr_image_bytes(item[2], f"{name}[{item[0]},{item[1]}]", None, tile_stat),
+        tiles, tile_stats,
+    ))
+
+    transcriptions = [[] for _ in columns]
+    for (column, _, _), text in zip(tiles, texts):
+        transcriptions[column].append(text)
+
+    sent_bytes = sum(tile_stat.get("processed_bytes", 0) for tile_stat in tile_stats)
+    stats.update({
+        "tiles": len(tiles),
+        "original_bytes": len(img_bytes),
+        "processed_bytes": sent_bytes,
+        "bytes_saved": len(img_bytes) - sent_bytes,
+        "ocr_seconds": round(time.perf_counter() - started, 3),
+    })
+    return stitch_transcriptions(transcriptions)
+
+
+def normalize_for_cache(raw_text: str) -> str:
+    """Canonical form of extracted text so trivially different re-uploads share a cache entry."""
+    text = unicodedata.normalize("NFC", raw_text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [" ".join(line.split()) for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def notes_cache_key(raw_text: str) -> str:
+    return cache_key(normalize_for_cache(raw_text), TEXT_MODEL, NOTES_PROMPT_VERSION, TEMPERATURE, NUM_CTX)
+
+
+NOTES_SYSTEM_PROMPT = """You are a senior project assistant with 10+ years of experience.
 Your job is to transform messy, incomplete notes into clear, actionable, professional documents.
 
 Do NOT use templates or fixed sections.
@@ -116,32 +414,97 @@ You MUST:
 - Output ONLY the enhanced notes — nothing else
 
 Now enhance these raw notes:
-<|im_end|>
+"""
+
+CHUNK_SYSTEM_PROMPT = """You are a senior project assistant with 10+ years of experience.
+You are given part {part} of {total} of a longer document.
+
+You MUST:
+- Turn this part into concise, well-structured markdown notes
+- Preserve all key facts, decisions, owners, dates, numbers and action items
+- Use headings and lists where they help
+- Do NOT add an introduction, a summary of the whole document, or a "Next Steps" section
+- Output ONLY the notes for this part — nothing else
+
+Structure this part:
+"""
+
+MERGE_SYSTEM_PROMPT = """You are a senior project assistant with 10+ years of experience.
+You are given structured notes written separately for consecutive parts of one document.
+
+You MUST:
+- Merge them into a single coherent, professional markdown document
+- Remove duplication and group related topics under shared headings
+- Preserve all key facts, decisions, owners, dates, numbers and action items
+- {ending}
+- NEVER say 'thinking', 'note', or 'here is the plan'
+- Output ONLY the merged notes — nothing else
+
+Merge these partial notes:
+"""
+
+
+def chat_prompt(system: str, user: str) -> str:
+    return f"""<|im_start|>system
+{system}<|im_end|>
 
 <|im_start|>user
-{raw_text}
+{user}
 <|im_end|>
 
 <|im_start|>assistant
 """
 
-        payload = {
-            "model": TEXT_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {"temperature": TEMPERATURE, "num_ctx": 8192}
-        }
 
-        response = requests.post(f"{OLLAMA_HOST}/api/generate", json=payload, timeout=600)
-        response.raise_for_status()
-        enhanced = response.json().get("response", "").strip()
+def generate_notes(prompt: str, on_token=None) -> str:
+    payload = {
+        "model": TEXT_MODEL,
+        "prompt": prompt,
+        "options": {"temperature": TEMPERATURE, "num_ctx": NUM_CTX}
+    }
+    return ollama_generate(payload, on_token).strip()
+
+
+def polish_notes(enhanced: str) -> str:
+    """Strip chatty preambles and make sure the note ends with next steps."""
+    # Clean up any accidental prefixes
+    enhanced = re.sub(r"^(Here is|The|Below is|Enhanced version).*?\n", "", enhanced, flags=re.IGNORECASE | re.MULTILINE).strip()
+
+    # Ensure there's a "Next Steps" or "Action Items" section
+    if not re.search(r"##\s*(Next Steps|Action Items|To-Do|What's Next)", enhanced, re.IGNORECASE):
+        enhanced += "\n\n## Next Steps\n- Review and confirm action items\n- Assign owners and deadlines"
+    return enhanced
+
+
+def text_to_project_notes(raw_text: str, on_token=None) -> str:
+    """
+    Uses a smart AI to turn raw notes into polished, insightful markdown.
+    Focuses on clarity, next steps, and professional tone.
+    Pass `on_token` to receive the note as it is being written.
+    Identical notes are served from `notes_cache` without calling Ollama,
+    and text too long for one context window is structured map-reduce style.
+    """
+    key = notes_cache_key(raw_text)
+    try:
+        cached = notes_cache.get(key)
+    except Exception as e:
+        logger.warning(f"⚠️ Notes cache unavailable: {e}")
+        cached = None
+    if cached is not None:
+        logger.info("⚡ Notes cache hit")
+        return cached
 
-        # Clean up any accidental prefixes
-        enhanced = re.sub(r"^(Here is|The|Below is|Enhanced version).*?\n", "", enhanced, flags=re.IGNORECASE | re.MULTILINE).strip()
+    try:
+        if estimate_tokens(raw_text) > CHUNK_TRIGGER_TOKENS:
+            enhanced = map_reduce_notes(raw_text, on_token)
+        else:
+            enhanced = generate_notes(chat_prompt(NOTES_SYSTEM_PROMPT, raw_text), on_token)
+        enhanced = polish_notes(enhanced)
 
-        # Ensure there's a "Next Steps" or "Action Items" section
-        if not re.search(r"##\s*(Next Steps|Action Items|To-Do|What's Next)", enhanced, re.IGNORECASE):
-            enhanced += "\n\n## Next Steps\n- Review and confirm action items\n- Assign owners and deadlines"
+        try:
+            notes_cache.set(key, enhanced)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not cache notes: {e}")
 
         return enhanced
 
@@ -155,19 +518,113 @@ The AI could not process your notes.
 Please try again with a shorter note or check the Ollama service."""
 
 
-def extract_text(filepath):
-    ext = Path(filepath).suffix.lower()
-
-    if ext in [".txt"]:
-        return extract_text_from_txt(filepath)
-    elif ext in [".doc", ".docx"]:
-        return extract_text_from_docx(filepath)
-    elif ext == ".pdf":
-        return extract_text_from_pdf(filepath)
-    elif ext in [".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".webp"]:
-        return image_to_text_ocr(Path(filepath))
-    else:
-        return f"[UNSUPPORTED FILE TYPE: {ext}] File not processed."
+# === LONG DOCUMENTS (MAP-REDUCE) ===
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; good enough to decide when a prompt will overflow num_ctx."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_oversized(block: str, max_chars: int):
+    """Break a block longer than `max_chars` on lines, then sentences, then hard cuts."""
+    if len(block) <= max_chars:
+        yield block
+        return
+    for separator in ("\n", ". "):
+        parts = block.split(separator)
+        if len(parts) > 1:
+            current = ""
+            for part in parts:
+                candidate = f"{current}{separator}{part}" if current else part
+                if len(candidate) <= max_chars:
+                    current = candidate
+                    continue
+                if current:
+                    yield current
+                if len(part) > max_chars:
+                    yield from split_oversized(part, max_chars)
+                    current = ""
+                else:
+                    current = part
+            if current:
+                yield current
+            return
+    for start in range(0, len(block), max_chars):
+        yield block[start:start + max_chars]
+
+
+def split_into_chunks(text: str, max_chars: int):
+    """
+    Pack the text into chunks of at most `max_chars`, cutting on the strongest
+    structural boundary available: page breaks, headings, then paragraphs.
+    """
+    blocks = re.split(r"\f|\n(?=#{1,6}\s)|\n\s*\n", text)
+    chunk, size = [], 0
+    for block in blocks:
+        block = block.strip()
+        if not block:
+            continue
+        for piece in split_oversized(block, max_chars):
+            if chunk and size + len(piece) > max_chars:
+                yield "\n\n".join(chunk)
+                chunk, size = [], 0
+            chunk.append(piece)
+            size += len(piece) + 2
+    if chunk:
+        yield "\n\n".join(chunk)
+
+
+def structure_chunk(text: str, part, total) -> str:
+    """Map step: structured notes for one part of a longer document."""
+    return generate_notes(chat_prompt(CHUNK_SYSTEM_PROMPT.format(part=part, total=total), text))
+
+
+def map_reduce_notes(raw_text: str, on_token=None) -> str:
+    """
+    Structure each chunk of a long document in parallel (map), then merge the
+    partial notes into one document (reduce).
+    """
+    chunks = list(split_into_chunks(raw_text, CHUNK_TOKENS * CHARS_PER_TOKEN))
+    logger.info(f"✂️ Long document: structuring {len(chunks)} chunks")
+
+    partials = list(fanout_pool.map(structure_chunk, chunks, range(1, len(chunks) + 1),
+                                    [len(chunks)] * len(chunks)))
+    return reduce_partials(partials, on_token)
+
+
+def reduce_partials(partials, on_token=None) -> str:
+    """
+    Merge partial notes, in document order, into one note. Merges that would
+    themselves overflow the context window are done in rounds until the final
+    merge fits; partials too large to pair with a neighbour are split first.
+    """
+    if len(partials) == 1:
+        return partials[0]
+
+    separator = "\n\n---\n\n"
+    merge_budget = CHUNK_TRIGGER_TOKENS * CHARS_PER_TOKEN
+    while len(separator.join(partials)) > merge_budget:
+        # Pieces of at most half the budget, so every group holds at least two and each round shrinks
+        pieces = [piece for partial in partials for piece in split_oversized(partial, merge_budget // 2)]
+        groups = [[]]
+        for piece in pieces:
+            if groups[-1] and len(separator.join(groups[-1] + [piece])) > merge_budget:
+                groups.append([])
+            groups[-1].append(piece)
+
+        logger.info(f"🔗 Merging {len(partials)} partial notes into {len(groups)}")
+        ending = "Do NOT add a \"Next Steps\" section yet"
+        merged = list(fanout_pool.map(
+            generate_notes,
+            [chat_prompt(MERGE_SYSTEM_PROMPT.format(ending=ending), separator.join(group)) for group in groups],
+        ))
+        if sum(map(len, merged)) >= sum(map(len, partials)):
+            raise ValueError("Partial notes are not getting shorter when merged; document is too long to combine")
+        partials = merged
+
+    ending = 'Include a "Next Steps" section at the end'
+    merged_input = separator.join(partials)
+    return generate_notes(chat_prompt(MERGE_SYSTEM_PROMPT.format(ending=ending), merged_input), on_token)
+
 
 # === ROUTES ===
 
@@ -187,90 +644,975 @@ def home():
         return f"<h1>📝 NoteBot</h1><p>Error loading page: {e}</p>", 500
 
 
+class FileTask:
+    """
+    One uploaded file travelling through the pipeline stages. `path` may also
+    be a list of image paths: pages of one notebook that become a single note.
+    `sha256` is the stored upload's content hash (None for merged pages).
+    """
+
+    def __init__(self, job, index, filename, path, sha256, options):
+        self.job = job
+        self.index = index
+        self.filename = filename
+        self.pages = [Path(page) for page in path] if isinstance(path, list) else None
+        self.path = self.pages[0] if self.pages else Path(path)
+        self.sha256 = sha256
+        self.options = options
+        self.raw_text = None
+        self.pdf_pages = None
+        self.partials = None
+        self.notes_key = None
+        self.ocr_stats = None
+        self.finished = threading.Event()
+        self.on_finished = None
+
+    def relay(self, stage):
+        """Token callback for `stage` when live streaming was requested, else None."""
+        if not self.options["live"]:
+            return None
+        return lambda text: self.job.publish_token(self.index, stage, text)
+
+    def update(self, **fields):
+        self.job.update_file(self.index, **fields)
+
+    def fail(self, error, **details):
+        logger.error(error)
+        self.update(status="failed", error=error, **details)
+        self.finish()
+
+    def finish(self):
+        self.finished.set()
+        if self.on_finished is not None:
+            self.on_finished()
+
+
+def extract_handler(task):
+    """Stage 1: hand the task to its kind's handler from the extractor registry."""
+    task.update(status="extracting")
+    STAGE_HANDLERS.get(kind_of(task.path), extract_document)(task)
+
+
+def extract_document(task):
+    """Default extract-stage handler: parse the file on the CPU pool, then structure it."""
+    try:
+        raw_text = extract_text(task.path)
+    except ExtractionFailed as e:
+        task.fail(f"Extract failed: {str(e)}", failure=e.details())
+        return
+    except Exception as e:
+        task.fail(f"Extract failed: {str(e)}")
+        return
+    route_extracted(task, raw_text)
+
+
+def iter_pdf_pages(path, total):
+    """(index, text, needs_ocr) for each page in order; long PDFs are extracted in page shards across processes."""
+    if PDF_PROCESSES <= 1 or total < PDF_PARALLEL_MIN_PAGES:
+        yield from isolated_stream(iter_page_texts, str(path), PDF_MIN_PAGE_CHARS)
+        return
+    if not SANDBOX_EXTRACTION:
+        yield from iter_page_texts(path, PDF_MIN_PAGE_CHARS, window=PDF_SHARD_PAGES, pool=pdf_pool,
+                                   ahead=2 * PDF_PROCESSES)
+        return
+    if not pdf_shard_slot.acquire(blocking=False):
+        yield from isolated_stream(iter_page_texts, str(path), PDF_MIN_PAGE_CHARS)
+        return
+    try:
+        yield from extraction_sandbox.stream(iter_page_texts_sharded, str(path), PDF_MIN_PAGE_CHARS,
+                                             PDF_PROCESSES, PDF_SHARD_PAGES)
+    finally:
+        pdf_shard_slot.release()
+
+
+def extract_pdf(task):
+    """Read the text layer page by page; pages without one go to the OCR stage."""
+    try:
+        total = isolated(page_count, str(task.path))
+        if total >= PDF_STREAM_MIN_PAGES:
+            pdf_stream_pool.submit(run_pdf_stream, task, total)
+            return
+        pages = [(text, needs_ocr) for _, text, needs_ocr in iter_pdf_pages(task.path, total)]
+    except ExtractionFailed as e:
+        task.fail(f"[ERROR: Could not read PDF] {str(e)}", failure=e.details())
+        return
+    except Exception as e:
+        task.fail(f"[ERROR: Could not read PDF] {str(e)}")
+        return
+    if any(needs_ocr for _, needs_ocr in pages):
+        task.pdf_pages = pages
+        ocr_stage.put(task)
+        return
+    route_extracted(task, "\n".join(text for text, _ in pages))
+
+
+def ocr_handler(task):
+    """Stage 2: transcribe images and scanned PDF pages with the vision model."""
+    if task.pages:
+        route_extracted(task, ocr_pages(task))
+        return
+    if task.pdf_pages is not None:
+        route_extracted(task, ocr_scanned_pdf_pages(task))
+        return
+    task.ocr_stats = {}
+    raw_text = image_to_text_ocr(task.path, task.relay("ocr"), task.ocr_stats, tile=task.options["tile"])
+    route_extracted(task, raw_text)
+
+
+def run_pdf_stream(task, total):
+    """pdf_stream_pool entry point: stream_pdf, with failures reported on the task."""
+    try:
+        stream_pdf(task, total)
+    except ExtractionFailed as e:
+        task.fail(f"[ERROR: Could not read PDF] {str(e)}", failure=e.details())
+    except Exception as e:
+        task.fail(f"[ERROR: Could not read PDF] {str(e)}")
+
+
+def stream_pdf(task, total):
+    """
+    Large PDFs: pages are extracted one at a time and packed into chunks that
+    are structured (map) as soon as they fill, while later pages are still
+    being read. Runs of scanned pages are OCR'd and structured as chunks of
+    their own. Only the current chunk, at most PDF_STREAM_MAX_PENDING chunks
+    in flight and the partial notes are held in memory, whatever the page count.
+    The structure stage then merges the partial notes (reduce).
+    """
+    key = streamed_pdf_cache_key(task.sha256)
+    try:
+        cached = notes_cache.get(key)
+    except Exception as e:
+        logger.warning(f"⚠️ Notes cache unavailable: {e}")
+        cached = None
+    if cached is not None:
+        logger.info(f"⚡ Notes cache hit: {task.filename}")
+        complete_task(task, cached)
+        return
+
+    max_chars = CHUNK_TOKENS * CHARS_PER_TOKEN
+    partials, in_flight = [], set()
+    buffer, buffered_chars, scanned = [], 0, []
+    preview = ""
+
+    def dispatch(fn, *args):
+        # Backpressure: don't read further ahead than the model can keep up with
+        while len(in_flight) >= PDF_STREAM_MAX_PENDING:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            in_flight.difference_update(done)
+        future = fanout_pool.submit(fn, *args)
+        partials.append(future)
+        in_flight.add(future)
+
+    def flush_text():
+        nonlocal buffer, buffered_chars
+        if buffer:
+            dispatch(structure_chunk, "\n\n".join(buffer), len(partials) + 1, "several")
+            buffer, buffered_chars = [], 0
+
+    def flush_scanned():
+        if scanned:
+            dispatch(structure_scanned_pages, task, list(scanned), len(partials) + 1)
+            scanned.clear()
+
+    for index, text, needs_ocr in iter_pdf_pages(task.path, total):
+        if needs_ocr:
+            flush_text()
+            scanned.append((index, text))
+            if len(scanned) >= PDF_STREAM_SCANNED_RUN:
+                flush_scanned()
+            continue
+        flush_scanned()
+        if len(preview) < 300:
+            preview += text[:300 - len(preview)]
+        for piece in split_into_chunks(text, max_chars):
+            if buffered_chars + len(piece) > max_chars:
+                flush_text()
+            buffer.append(piece)
+            buffered_chars += len(piece) + 2
+    flush_text()
+    flush_scanned()
+
+    logger.info(f"✂️ {task.filename}: streamed into {len(partials)} chunks")
+    task.raw_text = preview
+    task.partials = partials
+    task.notes_key = key
+    task.update(status="structuring")
+    structure_stage.put(task)
+
+
+def structure_scanned_pages(task, pages, part):
+    """
+    Map step for a run of scanned pages in a streamed PDF: render, OCR, then
+    structure. `pages` are (index, text layer) pairs; a page's own short text
+    is used if OCR fails or reads nothing.
+    """
+    texts = []
+    for index, layer_text in pages:
+        try:
+            text = ocr_image_bytes(render_pdf_page(task.path, index), f"{task.filename} p{index + 1}")
+        except Exception as e:
+            logger.warning(f"⚠️ Page {index + 1} of {task.filename} could not be OCR'd: {e}")
+            text = ""
+        if not text.strip():
+            text = layer_text if layer_text.strip() else f"[Page {index + 1} could not be read]"
+        texts.append(text)
+    return structure_chunk("\n".join(texts), part, "several")
+
+
+def reduce_streamed_pdf(task):
+    partials = [future.result() for future in task.partials]
+    if not partials:
+        raise ValueError("PDF contains no readable pages")
+    enhanced = polish_notes(reduce_partials(partials, task.relay("structuring")))
+    try:
+        notes_cache.set(task.notes_key, enhanced)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not cache notes: {e}")
+    return enhanced
+
+
+def streamed_pdf_cache_key(sha256):
+    """
+    Notes cache key for a streamed PDF, from the upload's content hash since
+    its full text is never held.
+    """
+    return cache_key("pdf-stream", sha256, TEXT_MODEL, NOTES_PROMPT_VERSION, TEMPERATURE,
+                     NUM_CTX, CHUNK_TOKENS, PDF_MIN_PAGE_CHARS)
+
+
+def ocr_scanned_pdf_pages(task):
+    """
+    Render and OCR only the PDF pages that had too little text, concurrently,
+    keeping page order. A page's own short text (a title, "Appendix A") is
+    kept if OCR fails or reads nothing.
+    """
+    missing = [index for index, (_, needs_ocr) in enumerate(task.pdf_pages) if needs_ocr]
+    page_stats = [{} for _ in missing]
+    logger.info(f"🖨️ {task.filename}: OCR for {len(missing)} of {len(task.pdf_pages)} pages")
+
+    def read_page(index, stats):
+        try:
+            image = render_pdf_page(task.path, index)
+            return ocr_image_bytes(image, f"{task.filename} p{index + 1}", None, stats)
+        except Exception as e:
+            stats["error"] = str(e)
+            return None
+
+    texts = [text for text, _ in task.pdf_pages]
+    for index, text in zip(missing, fanout_pool.map(read_page, missing, page_stats)):
+        if text and text.strip():
+            texts[index] = text
+        elif not texts[index].strip():
+            texts[index] = None
+    task.ocr_stats = {"scanned_pages": [index + 1 for index in missing], "renderer": rendering_engine(),
+                      "pages": page_stats}
+
+    if all(text is None for text in texts):
+        return f"[ERROR: Could not read PDF] Scanned pages could not be OCR'd: {page_stats[0].get('error')}"
+    return "\n".join(
+        text if text is not None else f"[Page {index + 1} could not be read]"
+        for index, text in enumerate(texts)
+    )
+
+
+def ocr_pages(task):
+    """OCR each page of a merged upload concurrently and join them in upload order."""
+    page_stats = [{} for _ in task.pages]
+    texts = list(fanout_pool.map(
+        lambda page, stats: image_to_text_ocr(page, None, stats, tile=task.options["tile"]),
+        task.pages, page_stats,
+    ))
+    task.ocr_stats = {"pages": page_stats}
+
+    readable = [text for text in texts if not text.startswith("[OCR ERROR")]
+    if not readable:
+        return texts[0]
+    sections = []
+    for number, text in enumerate(texts, start=1):
+        if text.startswith("[OCR ERROR"):
+            logger.warning(f"⚠️ Page {number} of {task.filename} unreadable: {text}")
+            text = "[This page could not be read]"
+        sections.append(f"--- Page {number} ---\n{text}")
+    return "\n\n".join(sections)
+
+
+def route_extracted(task, raw_text):
+    logger.info(f"📄 Extracted text (first 200 chars): {raw_text[:200]}")
+    if raw_text.startswith("[ERROR") or "[UNSUPPORTED" in raw_text:
+        task.fail(raw_text)
+        return
+    task.raw_text = raw_text
+    task.update(status="structuring")
+    structure_stage.put(task)
+
+
+def structure_handler(task):
+    """Stage 3: turn extracted text into structured notes and save them."""
+    try:
+        logger.info("🧠 Sending to AI for structuring...")
+        if task.partials is not None:
+            enhanced_notes = reduce_streamed_pdf(task)
+        else:
+            enhanced_notes = text_to_project_notes(task.raw_text, task.relay("structuring"))
+        logger.info("✅ AI responded successfully.")
+        complete_task(task, enhanced_notes)
+    except requests.exceptions.Timeout:
+        task.fail("❌ AI timeout: Model took too long to respond (increase timeout?)")
+    except requests.exceptions.RequestException as e:
+        task.fail(f"❌ Ollama API error: {str(e)}")
+    except Exception as e:
+        task.fail(f"❌ Unexpected error during AI processing: {str(e)}")
+
+
+def complete_task(task, enhanced_notes):
+    # Save to outputs folder
+    output_path = outputs_dir / f"{Path(task.filename).stem}.md"
+    output_path.write_text(enhanced_notes, encoding="utf-8")
+
+    result = {}
+    if task.ocr_stats is not None:
+        result["ocr_stats"] = task.ocr_stats
+    task.update(
+        status="success",
+        raw_text_preview=(task.raw_text or "")[:300],
+        enhanced_notes=enhanced_notes,
+        **result,
+    )
+    task.finish()
+
+
+def stage_error(task, exc):
+    task.fail(f"❌ Unexpected error: {str(exc)}")
+
+
+extract_stage = Stage("extract", EXTRACT_WORKERS, extract_handler, stage_error)
+ocr_stage = Stage("ocr", OCR_WORKERS, ocr_handler, stage_error)
+structure_stage = Stage("structure", STRUCTURE_WORKERS, structure_handler, stage_error)
+PIPELINE_STAGES = [extract_stage, ocr_stage, structure_stage]
+
+
+# === EXTRACTOR REGISTRY ===
+# Extractor kind (from formats.py) -> function(path) returning the file's text.
+# A new format needs `register_format` in formats.py and `register_extractor` here.
+EXTRACTORS = {
+    "text": extract_text_from_txt,
+    "docx": extract_text_from_docx,
+    "pdf": extract_text_from_pdf,
+    "image": image_to_text_ocr,
+}
+
+# Extract-stage handler, function(task), for kinds that need more than the default
+# extract_document: images go straight to the vision model, PDFs are read page by page.
+STAGE_HANDLERS = {
+    "pdf": extract_pdf,
+    "image": ocr_stage.put,
+}
+
+
+def register_extractor(kind, extract, stage_handler=None):
+    EXTRACTORS[kind] = extract
+    if stage_handler is not None:
+        STAGE_HANDLERS[kind] = stage_handler
+
+
+def extract_text(filepath):
+    extract = EXTRACTORS.get(kind_of(filepath))
+    if extract is None:
+        return f"[UNSUPPORTED FILE TYPE: {Path(filepath).suffix.lower()}] File not processed."
+    return extract(Path(filepath))
+
+
+STREAM_FORMATS = ("ndjson", "sse")
+
+
+def stream_job_events(job, stream_format, after=0):
+    """Build a streaming response that relays job events as NDJSON lines or SSE messages."""
+    def generate():
+        for event in job.iter_events(after):
+            if event is None:
+                # Keep-alive so proxies don't drop a quiet connection
+                yield ": keep-alive\n\n" if stream_format == "sse" else "\n"
+            elif stream_format == "sse":
+                yield f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+            else:
+                yield json.dumps(event) + "\n"
+
+    mimetype = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return Response(generate(), mimetype=mimetype,
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def run_job(job, saved_files, options):
+    """
+    Worker entry point: feed a job's uploads into the pipeline and wait for
+    every file to finish. The stages do the work; this thread only tracks it.
+    """
+    tasks = [FileTask(job, index, filename, temp_path, sha256, options)
+             for index, (filename, temp_path, sha256) in enumerate(saved_files)]
+    for task in tasks:
+        extract_stage.put(task)
+    for task in tasks:
+        task.finished.wait()
+
+
+class IncrementalJob:
+    """
+    A job that takes files while they are still uploading, from one request
+    or, for a job opened with POST /api/jobs, from several. Each file goes into
+    the pipeline from the request thread as soon as its part has arrived; no
+    JobQueue worker waits on the upload. The job completes once it has been
+    closed, its uploads have ended and every file dispatched has finished.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self._lock = threading.Lock()
+        self._uploads = 0
+        self._outstanding = 0
+        self._closed = False
+        self._completed = False
+        job_queue.track(job)
+        job.set_status("running")
+
+    def upload(self, options, ref=None):
+        """Start receiving one request's files; None once the job has been closed."""
+        with self._lock:
+            if self._closed:
+                return None
+            self._uploads += 1
+        return IncomingUpload(self, options, ref)
+
+    def close(self):
+        """No more uploads: the job completes once what has arrived is processed."""
+        with self._lock:
+            self._closed = True
+        self._settle()
+
+    def dispatch(self, filename, path, sha256, options, **fields):
+        task = FileTask(self.job, self.job.add_file(filename, **fields), filename, path, sha256, options)
+        task.on_finished = self._task_finished
+        with self._lock:
+            self._outstanding += 1
+        extract_stage.put(task)
+
+    def upload_ended(self):
+        with self._lock:
+            self._uploads -= 1
+        self._settle()
+
+    def _task_finished(self):
+        with self._lock:
+            self._outstanding -= 1
+        self._settle()
+
+    def _settle(self):
+        with self._lock:
+            if not self._closed or self._uploads or self._outstanding or self._completed:
+                return
+            self._completed = True
+        self.job.set_status("completed")
+
+
+class IncomingUpload:
+    """
+    The files of one incremental request. `ref` is the client's label for the
+    request, copied onto each of its files. With merge_pages, images are held
+    back and merged into one note when the request ends.
+    """
+
+    def __init__(self, incremental_job, options, ref):
+        self.incremental_job = incremental_job
+        self.job = incremental_job.job
+        self.options = options
+        self.fields = {"ref": ref} if ref else {}
+        self._pages = []
+
+    def add(self, filename, path, sha256):
+        """A file that has fully arrived and been stored."""
+        if self.options["merge_pages"] and kind_of(path) == "image":
+            self._pages.append((filename, path, sha256))
+        else:
+            self.incremental_job.dispatch(filename, path, sha256, self.options, **self.fields)
+
+    def reject(self, filename, error):
+        logger.warning(f"🚫 Rejected upload in job {self.job.id}: {error}")
+        self.job.update_file(self.job.add_file(filename, **self.fields), status="failed", error=str(error))
+
+    def end(self):
+        """The request's body has been read: whatever arrived is processed."""
+        for filename, path, sha256 in merge_page_uploads(self._pages):
+            self.incremental_job.dispatch(filename, path, sha256, self.options, **self.fields)
+        self._pages = []
+        self.incremental_job.upload_ended()
+
+
+# Jobs opened with POST /api/jobs that are still taking uploads, by job ID
+open_jobs = {}
+open_jobs_lock = threading.Lock()
+
+
+def processing_options(form):
+    """Per-upload switches sent alongside the files."""
+    def flag(name, default=False):
+        value = form.get(name)
+        return default if value is None else value == "1"
+
+    return {
+        # Opt-in token streaming: only worth the extra events when the client streams too
+        "live": flag("live"),
+        # Read large images in overlapping tiles
+        "tile": flag("tile", OCR_TILING),
+        # Treat all images in the upload as pages of one note
+        "merge_pages": flag("merge_pages"),
+    }
+
+
+def merge_page_uploads(saved_files):
+    """
+    Collapse the image uploads of a batch into one multi-page entry, placed
+    where the first image was; other files are left as they are.
+    """
+    image_positions = [position for position, (_, path, _) in enumerate(saved_files)
+                       if kind_of(path) == "image"]
+    if len(image_positions) < 2:
+        return saved_files
+
+    first_name = saved_files[image_positions[0]][0]
+    merged_name = f"{Path(first_name).stem} ({len(image_positions)} pages){Path(first_name).suffix}"
+    merged = []
+    for position, upload in enumerate(saved_files):
+        if position == image_positions[0]:
+            merged.append((merged_name, [saved_files[index][1] for index in image_positions], None))
+        elif position not in image_positions:
+            merged.append(upload)
+    return merged
+
+
+def store_spooled_upload(filename, spool):
+    """
+    Identify a fully received HashingSpool, check it against its type's size
+    limit and move it into the upload store; returns (filename, path, sha256).
+    Raises UnsupportedFormat or UploadTooLarge naming the file.
+    """
+    # Identify the content before storing anything; it is stored under its real extension
+    try:
+        file_format = sniff(spool)
+    except UnsupportedFormat as e:
+        raise UnsupportedFormat(f"{filename}: {e}") from None
+
+    limit = upload_limit(file_format.kind)
+    if spool.size > limit:
+        raise UploadTooLarge(f"{filename} is larger than {limit // (1024 * 1024)}MB")
+    # Hashed while it was received: moving the spool file into the store is all that's left
+    spool.close()
+    stored = upload_store.adopt(spool.path, spool.sha256, spool.size, filename, file_format.extension)
+    if stored.duplicate:
+        logger.info(f"♻️ Upload already stored: {filename} -> {stored.path}")
+    else:
+        logger.info(f"✅ Saved upload: {filename} -> {stored.path}")
+    return filename, stored.path, stored.sha256
+
+
+def finalized_upload(upload_id):
+    """(filename, path, sha256) of a file sent through the resumable upload API."""
+    finalized = upload_sessions.finalized(upload_id)
+    return finalized["filename"], Path(finalized["path"]), finalized["sha256"]
+
+
+def queued_job_response(job):
+    # ?stream=ndjson or ?stream=sse: emit each file's result as soon as it is ready
+    stream_format = request.args.get("stream")
+    if stream_format in STREAM_FORMATS:
+        return stream_job_events(job, stream_format)
+
+    return jsonify({
+        "message": "Processing queued",
+        "job_id": job.id,
+        "status_url": f"/api/jobs/{job.id}",
+        "results_url": f"/api/jobs/{job.id}/results",
+    }), 202
+
+
 @app.route("/api/process", methods=["POST"])
 def process_files():
-    """Handle file uploads, extract text, and enhance with AI."""
-    import logging as py_logging
-    py_logging.basicConfig(level=py_logging.INFO)
+    """Save uploads and queue them for background processing; returns a job ID."""
+    if request.args.get("incremental") == "1":
+        return process_files_incrementally()
 
-    if "files" not in request.files:
+    upload_ids = request.form.getlist("upload_ids")
+    if "files" not in request.files and not upload_ids:
         return jsonify({"error": "No file part in request"}), 400
 
     files = request.files.getlist("files")
-    if not files or all(f.filename == "" for f in files):
+    if not upload_ids and (not files or all(f.filename == "" for f in files)):
         return jsonify({"error": "No selected files"}), 400
 
-    results = []
+    saved_files = []
 
     for file in files:
         if not file or not file.filename:
             continue
 
-        filename = file.filename
-        temp_path = uploads_dir / filename
-        counter = 1
-        while temp_path.exists():
-            temp_path = uploads_dir / f"{Path(filename).stem}_{counter}{Path(filename).suffix}"
-            counter += 1
-        file.save(temp_path)
-        py_logging.info(f"✅ Saved upload: {temp_path}")
+        try:
+            saved_files.append(store_spooled_upload(file.filename, file.stream))
+        except UnsupportedFormat as e:
+            return jsonify({"error": str(e)}), 415
+        except UploadTooLarge as e:
+            return jsonify({"error": str(e)}), 413
 
-        # Step 1: Extract text
+    # Files already sent through the resumable upload API, in the order given
+    for upload_id in upload_ids:
         try:
-            raw_text = extract_text(temp_path)
-            py_logging.info(f"📄 Extracted text (first 200 chars): {raw_text[:200]}")
-        except Exception as e:
-            error_msg = f"Extract failed: {str(e)}"
-            py_logging.error(error_msg)
-            results.append({
-                "filename": filename,
-                "status": "failed",
-                "error": error_msg
-            })
-            continue
+            saved_files.append(finalized_upload(upload_id))
+        except UnknownUpload:
+            return jsonify({"error": f"Unknown upload: {upload_id}"}), 404
+        except IncompleteUpload as e:
+            return jsonify({"error": f"{upload_id}: {e}"}), 409
+
+    options = processing_options(request.form)
+    if options["merge_pages"]:
+        saved_files = merge_page_uploads(saved_files)
+
+    job = Job([filename for filename, _, _ in saved_files])
+    try:
+        job_queue.submit(job, run_job, saved_files, options)
+    except JobQueueFull as e:
+        logger.warning(f"⏳ Job queue full: {e}")
+        return jsonify({"error": "Server is busy, please try again shortly"}), 503
+
+    return queued_job_response(job)
+
+
+def process_files_incrementally():
+    """
+    POST /api/process?incremental=1: the job starts before the body has been
+    read, and each file part goes into the pipeline the moment it has fully
+    arrived, so the first files are being extracted while the rest upload.
+    Options come from the query string, since form fields sent after the
+    files would arrive too late to apply. A file that is rejected fails on
+    its own instead of failing the whole request. With ?job_id= the files
+    join a job opened with POST /api/jobs, tagged with ?ref=.
+    """
+    mimetype, params = parse_options_header(request.content_type or "")
+    if mimetype != "multipart/form-data" or not params.get("boundary"):
+        return jsonify({"error": "Expected a multipart/form-data body"}), 400
+
+    options = processing_options(request.args)
+    job_id = request.args.get("job_id")
+    if job_id:
+        with open_jobs_lock:
+            incremental_job = open_jobs.get(job_id)
+        if incremental_job is None:
+            return jsonify({"error": "Unknown or closed job"}), 404
+    else:
+        incremental_job = IncrementalJob(Job([]))
+    incoming = incremental_job.upload(options, request.args.get("ref"))
+    if incoming is None:
+        return jsonify({"error": "Unknown or closed job"}), 404
+
+    job = incremental_job.job
+    try:
+        received = receive_parts(params["boundary"].encode("latin-1"), incoming)
+    except ValueError as e:
+        logger.warning(f"⚠️ Malformed multipart upload for job {job.id}: {e}")
+        return jsonify({"error": f"Malformed upload: {e}", "job_id": job.id}), 400
+    finally:
+        incoming.end()
+        if not job_id:
+            incremental_job.close()
+
+    if not received:
+        return jsonify({"error": "No selected files"}), 400
+    return queued_job_response(job)
 
-        if raw_text.startswith("[ERROR") or "[UNSUPPORTED" in raw_text:
-            results.append({
-                "filename": filename,
-                "status": "failed",
-                "error": raw_text
-            })
-            continue
 
-        # Step 2: Send to AI for structuring
+def receive_parts(boundary, incoming):
+    """
+    Read the multipart body off the wire, spooling file parts through
+    HashingSpool and adding each one to the IncomingUpload `incoming` as soon
+    as it is complete; `upload_ids` fields hand over resumable uploads in place.
+    Returns the number of files received, rejected ones included.
+    """
+    # The decoder's own max_form_memory_size bounds its buffer for file parts too, so fields are capped here
+    decoder = MultipartDecoder(boundary)
+    received = 0
+    part = None   # (name, spool or field buffer, or None while skipping a rejected file)
+
+    reject = incoming.reject
+
+    def complete_part(name, target):
+        if isinstance(target, HashingSpool):
+            if not name:
+                return 0  # An empty file input
+            target.seek(0)
+            try:
+                incoming.add(*store_spooled_upload(name, target))
+            except (UnsupportedFormat, UploadTooLarge) as e:
+                reject(name, e)
+            return 1
+        if name != "upload_ids":
+            return 0
+        upload_id = target.getvalue().decode("utf-8", "replace").strip()
         try:
-            py_logging.info("🧠 Sending to AI for structuring...")
-            enhanced_notes = text_to_project_notes(raw_text)
-            py_logging.info("✅ AI responded successfully.")
-
-            # Save to outputs folder
-            output_path = outputs_dir / f"{Path(filename).stem}.md"
-            output_path.write_text(enhanced_notes, encoding="utf-8")
-
-            results.append({
-                "filename": filename,
-                "status": "success",
-                "raw_text_preview": raw_text[:300],
-                "enhanced_notes": enhanced_notes
-            })
-        except requests.exceptions.Timeout:
-            error = "❌ AI timeout: Model took too long to respond (increase timeout?)"
-            py_logging.error(error)
-            results.append({"filename": filename, "status": "failed", "error": error})
-        except requests.exceptions.RequestException as e:
-            error = f"❌ Ollama API error: {str(e)}"
-            py_logging.error(error)
-            results.append({"filename": filename, "status": "failed", "error": error})
-        except Exception as e:
-            error = f"❌ Unexpected error during AI processing: {str(e)}"
-            py_logging.error(error)
-            results.append({"filename": filename, "status": "failed", "error": error})
+            incoming.add(*finalized_upload(upload_id))
+        except UnknownUpload:
+            reject(upload_id, f"Unknown upload: {upload_id}")
+        except IncompleteUpload as e:
+            reject(upload_id, f"{upload_id}: {e}")
+        return 1
+
+    while True:
+        event = decoder.next_event()
+        if event is NEED_DATA:
+            decoder.receive_data(request.stream.read(INCREMENTAL_READ_BYTES) or None)
+        elif isinstance(event, File):
+            spool = HashingSpool(temp_dir, max_bytes=max(UPLOAD_MAX_MB, PDF_UPLOAD_MAX_MB) * 1024 * 1024)
+            request.spools.append(spool)  # Deleted when the request ends unless it was stored
+            part = (event.filename, spool)
+        elif isinstance(event, Field):
+            part = (event.name, io.BytesIO())
+        elif isinstance(event, Data):
+            name, target = part
+            if target is None:
+                continue  # The rest of a rejected file
+            if isinstance(target, io.BytesIO) and target.tell() + len(event.data) > FORM_FIELD_MAX_BYTES:
+                raise RequestEntityTooLarge(f"Form field {name} is too large")
+            try:
+                target.write(event.data)
+            except UploadTooLarge as e:
+                received += 1
+                reject(name, f"{name}: {e}")
+                part = (name, None)
+                continue
+            if not event.more_data:
+                received += complete_part(name, target)
+        elif isinstance(event, Epilogue):
+            return received
+
+
+# === RESUMABLE UPLOADS ===
+# POST /api/uploads {filename, size} -> PUT /api/uploads/<id>?offset=N (raw bytes, any order,
+# concurrently) -> GET /api/uploads/<id> to see what arrived -> POST /api/uploads/<id>/finalize,
+# then POST /api/process with upload_ids=<id> (repeatable) to queue the files.
+@app.route("/api/uploads", methods=["POST"])
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get("filename") or "").strip()
+    size = data.get("size")
+    if not filename or not isinstance(size, int) or size < 0:
+        return jsonify({"error": "filename and size are required"}), 400
+
+    largest = max(UPLOAD_MAX_MB, PDF_UPLOAD_MAX_MB)
+    if size > largest * 1024 * 1024:
+        return jsonify({"error": f"{filename} is larger than {largest}MB"}), 413
+
+    state = upload_sessions.create(filename, size)
+    logger.info(f"📦 Resumable upload started: {filename} ({size} bytes)")
+    return jsonify({
+        "upload_id": state["upload_id"],
+        "chunk_size": UPLOAD_CHUNK_MB * 1024 * 1024,
+        "upload_url": f"/api/uploads/{state['upload_id']}",
+    }), 201
+
+
+@app.route("/api/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Which byte ranges of an upload have arrived, so a client can resume."""
+    try:
+        return jsonify(upload_session_summary(upload_sessions.status(upload_id)))
+    except UnknownUpload:
+        return jsonify({"error": "Unknown upload"}), 404
+
+
+@app.route("/api/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        return jsonify({"error": "offset is required"}), 400
+    try:
+        state = upload_sessions.write_chunk(upload_id, offset, request.stream)
+    except UnknownUpload:
+        return jsonify({"error": "Unknown upload"}), 404
+    except InvalidChunk as e:
+        return jsonify({"error": str(e)}), 416
+    return jsonify(upload_session_summary(state))
+
+
+@app.route("/api/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    """Check the upload is complete and valid, then move it into the upload store."""
+    try:
+        state = upload_sessions.status(upload_id)
+        if state["finalized"]:
+            return jsonify(upload_session_summary(state))
+        data_path, sha256 = upload_sessions.assemble(upload_id)
+    except UnknownUpload:
+        return jsonify({"error": "Unknown upload"}), 404
+    except IncompleteUpload as e:
+        return jsonify({"error": str(e)}), 409
+
+    filename = state["filename"]
+    try:
+        file_format = sniff(data_path)
+    except UnsupportedFormat as e:
+        upload_sessions.discard(upload_id)
+        return jsonify({"error": f"{filename}: {e}"}), 415
+    limit = upload_limit(file_format.kind)
+    if state["size"] > limit:
+        upload_sessions.discard(upload_id)
+        return jsonify({"error": f"{filename} is larger than {limit // (1024 * 1024)}MB"}), 413
+
+    stored = upload_store.adopt(data_path, sha256, state["size"], filename, file_format.extension)
+    logger.info(f"✅ Resumable upload complete: {filename} -> {stored.path}")
+    upload_sessions.mark_finalized(upload_id, path=str(stored.path), filename=filename, sha256=sha256)
+    return jsonify(upload_session_summary(upload_sessions.status(upload_id)))
+
+
+def upload_session_summary(state):
+    return {
+        "upload_id": state["upload_id"],
+        "filename": state["filename"],
+        "size": state["size"],
+        "received": state["received"],
+        "received_bytes": state["received_bytes"],
+        "complete": state["complete"],
+        "finalized": bool(state["finalized"]),
+    }
+
+
+@app.errorhandler(UploadTooLarge)
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    """Over-size uploads, caught while the body was still streaming in."""
+    message = str(e) if isinstance(e, UploadTooLarge) else "Upload is too large"
+    return jsonify({"error": message}), 413
+
+
+@app.route("/api/jobs", methods=["POST"])
+def open_job():
+    """
+    Open an empty job that several incremental uploads (?job_id=) can add
+    files to, so a client sending one request per file follows them all on
+    one events stream. POST /api/jobs/<id>/close once every upload is sent.
+    """
+    # Jobs a client opened and never closed (a tab shut mid-upload) are closed after JOB_TTL_SECONDS
+    cutoff = time.time() - JOB_TTL_SECONDS
+    with open_jobs_lock:
+        abandoned = [open_jobs.pop(job_id) for job_id, incremental_job in list(open_jobs.items())
+                     if incremental_job.job.created_at < cutoff]
+    for incremental_job in abandoned:
+        incremental_job.close()
+
+    incremental_job = IncrementalJob(Job([]))
+    job = incremental_job.job
+    with open_jobs_lock:
+        open_jobs[job.id] = incremental_job
+    return jsonify({
+        "job_id": job.id,
+        "events_url": f"/api/jobs/{job.id}/events",
+        "status_url": f"/api/jobs/{job.id}",
+        "results_url": f"/api/jobs/{job.id}/results",
+    }), 201
+
+
+@app.route("/api/jobs/<job_id>/close", methods=["POST"])
+def close_job(job_id):
+    """Stop an open job taking uploads; it completes once its files are processed."""
+    with open_jobs_lock:
+        incremental_job = open_jobs.pop(job_id, None)
+    if incremental_job is None:
+        return jsonify({"error": "Unknown or closed job"}), 404
+    incremental_job.close()
+    return jsonify(incremental_job.job.summary())
+
+
+@app.route("/api/jobs/<job_id>")
+def job_status(job_id):
+    """Report overall and per-file status for a queued job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.summary())
+
 
+@app.route("/api/jobs/<job_id>/events")
+def job_events(job_id):
+    """Stream a job's progress and per-file results (SSE by default, ?format=ndjson)."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    stream_format = request.args.get("format", "sse")
+    if stream_format not in STREAM_FORMATS:
+        return jsonify({"error": f"Unsupported format: {stream_format}"}), 400
+
+    # EventSource reconnects send the last sequence number they saw
+    last_seen = request.headers.get("Last-Event-ID", "")
+    after = int(last_seen) + 1 if last_seen.isdigit() else 0
+    return stream_job_events(job, stream_format, after)
+
+
+@app.route("/api/jobs/<job_id>/results")
+def job_results(job_id):
+    """Return per-file results (including enhanced notes) for a job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({
+        "message": "Processing completed" if job.done else "Processing in progress",
+        "job_id": job.id,
+        "status": job.status,
+        "results": job.results(),
+    })
+
+@app.route("/api/pipeline/stats")
+def pipeline_stats():
+    """Per-stage queue depth and utilisation, for sizing each worker pool."""
+    return jsonify({
+        "stages": {stage.name: stage.stats() for stage in PIPELINE_STAGES},
+        "jobs": job_queue.stats(),
+        "ollama_scheduler": ollama_scheduler.stats(),
+    })
+
+
+@app.route("/api/ollama/metrics")
+def ollama_metrics():
+    """Per-model call counts and Ollama timings (load, prompt eval, generation)."""
+    return jsonify(ollama.metrics())
+
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    """Hit/miss counters and sizes for the model output caches, plus upload deduplication."""
+    return jsonify({"notes": notes_cache.stats(), "ocr": ocr_cache.stats(), "uploads": upload_store.stats()})
+
+
+@app.route("/api/upload-settings")
+def upload_settings():
+    """How the web page should pace its uploads: parallel requests, and the size above which files go in chunks."""
     return jsonify({
-        "message": "Processing completed",
-        "results": results
+        "concurrency": UPLOAD_CONCURRENCY,
+        "chunk_size": UPLOAD_CHUNK_MB * 1024 * 1024,
     })
 
+
+@app.route("/api/image-target")
+def image_target():
+    """
+    The resolution and encoding the OCR path works at, so clients can shrink
+    photos before uploading them. Uploads meant for tiled OCR keep more
+    pixels, since tiles are cut from the full image.
+    """
+    return jsonify({
+        "enabled": CLIENT_IMAGE_RESIZE,
+        "max_side": OCR_MAX_SIDE,
+        "tile_max_side": max(CLIENT_TILE_MAX_SIDE, OCR_MAX_SIDE),
+        "tile_by_default": OCR_TILING,
+        "type": "image/jpeg",
+        "quality": OCR_JPEG_QUALITY / 100,
+    })
+
+
 @app.route("/health")
 def health():
     """Health check endpoint"""
@@ -0,0 +1,84 @@
+"""
+NoteBot DOCX Benchmark
+Compares the streaming DOCX extractor with mammoth on a folder of real
+documents: median time, peak Python memory and output size per file.
+
+Usage: python benchmarks/bench_docx.py path/to/docs [more paths...] [--runs 5]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import mammoth
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from docx_extract import docx_text
+
+
+def mammoth_text(path):
+    with open(path, "rb") as f:
+        return mammoth.extract_raw_text(f).value.strip()
+
+
+ENGINES = {"fast": docx_text, "mammoth": mammoth_text}
+
+
+def measure(engine, path, runs):
+    """(median seconds, peak traced bytes, characters of output) for one engine on one file."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        text = engine(path)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    engine(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, len(text)
+
+
+def collect(paths):
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(path.rglob("*.docx"))
+        elif path.suffix.lower() == ".docx":
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help=".docx files or folders to search")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per file and engine")
+    args = parser.parse_args()
+
+    files = list(collect(args.paths))
+    if not files:
+        sys.exit("No .docx files found")
+
+    totals = {name: [0.0, 0] for name in ENGINES}
+    print(f"{'file':40} {'engine':8} {'median ms':>10} {'peak KB':>9} {'chars':>8}")
+    for path in files:
+        for name, engine in ENGINES.items():
+            try:
+                seconds, peak, chars = measure(engine, path, args.runs)
+            except Exception as e:
+                print(f"{path.name[:40]:40} {name:8} failed: {e}")
+                continue
+            totals[name][0] += seconds
+            totals[name][1] = max(totals[name][1], peak)
+            print(f"{path.name[:40]:40} {name:8} {seconds * 1000:10.1f} {peak / 1024:9.0f} {chars:8}")
+
+    print()
+    for name, (seconds, peak) in totals.items():
+        print(f"{name:8} total {seconds:.3f}s, worst peak {peak / 1024:.0f} KB over {len(files)} files")
+    if totals["fast"][0]:
+        print(f"speed-up: {totals['mammoth'][0] / totals['fast'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+NoteBot DOCX Extraction
+Streams word/document.xml out of the .docx zip with iterparse instead of
+building a full document model. Paragraphs, list items and table rows
+come out as separate blocks, in document order; elements are discarded
+as soon as their text has been read, so memory stays flat. mammoth is
+the fallback for documents the streaming parser cannot read.
+"""
+
+import logging
+import xml.etree.ElementTree as ET
+import zipfile
+
+import mammoth
+
+logger = logging.getLogger("notebot")
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+
+def iter_blocks(filepath):
+    """
+    Yield the document body's text blocks: one per paragraph ("- " prefixed
+    for list items) and one per table row (cells joined with " | ").
+    Empty paragraphs are skipped.
+    """
+    paragraphs = []   # Open paragraphs; text boxes nest paragraphs inside paragraphs
+    rows = []         # Open table rows, each a list of cells, each a list of paragraph texts
+    in_properties = 0
+    in_fallback = 0   # Legacy copies of text boxes that duplicate the modern markup
+
+    with zipfile.ZipFile(filepath) as archive, archive.open("word/document.xml") as xml:
+        for event, elem in ET.iterparse(xml, events=("start", "end")):
+            tag = elem.tag
+            if tag == MC + "Fallback":
+                in_fallback += 1 if event == "start" else -1
+                continue
+            if in_fallback:
+                if event == "end":
+                    elem.clear()
+                continue
+
+            if event == "start":
+                if tag == W + "p":
+                    paragraphs.append({"runs": [], "list": False})
+                elif tag == W + "pPr":
+                    in_properties += 1
+                elif tag == W + "tr":
+                    rows.append([])
+                elif tag == W + "tc" and rows:
+                    rows[-1].append([])
+                continue
+
+            if tag == W + "t" and paragraphs:
+                paragraphs[-1]["runs"].append(elem.text or "")
+            elif tag == W + "tab" and paragraphs and not in_properties:
+                paragraphs[-1]["runs"].append("\t")
+            elif tag in (W + "br", W + "cr") and paragraphs:
+                paragraphs[-1]["runs"].append("\n")
+            elif tag == W + "numPr" and paragraphs:
+                paragraphs[-1]["list"] = True
+            elif tag == W + "pPr":
+                in_properties -= 1
+            elif tag == W + "p":
+                paragraph = paragraphs.pop()
+                text = "".join(paragraph["runs"]).strip()
+                if text and paragraph["list"]:
+                    text = f"- {text}"
+                if text:
+                    if rows and rows[-1]:
+                        rows[-1][-1].append(text)
+                    else:
+                        yield text
+                elem.clear()
+            elif tag == W + "tr":
+                cells = rows.pop()
+                row = " | ".join(" ".join(cell) for cell in cells)
+                if row.strip(" |"):
+                    if rows and rows[-1]:
+                        rows[-1][-1].append(row)  # Nested table
+                    else:
+                        yield row
+                elem.clear()
+
+
+def docx_text(filepath):
+    """Plain text of a .docx, with a blank line between blocks (as mammoth's raw text has)."""
+    return "\n\n".join(iter_blocks(filepath))
+
+
+def extract_docx(filepath, engine="fast"):
+    """Text of a .docx; the "fast" engine falls back to mammoth if it fails."""
+    if engine == "fast":
+        try:
+            return docx_text(filepath)
+        except Exception as e:
+            logger.warning(f"⚠️ Fast DOCX parser failed on {filepath}, using mammoth: {e}")
+    with open(filepath, "rb") as f:
+        return mammoth.extract_raw_text(f).value.strip()
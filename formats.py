@@ -0,0 +1,170 @@
+"""
+NoteBot File Formats
+Identifies uploads from their first bytes rather than their names, so
+misnamed files take the right path and unsupported content (legacy Word
+.doc, RTF, HEIC photos, arbitrary binaries) is rejected before any
+extraction work is queued. New formats are added with `register_format`.
+"""
+
+import codecs
+import io
+import re
+import zipfile
+from collections import namedtuple
+from pathlib import Path
+
+SNIFF_BYTES = 8192
+
+# `kind` selects the extractor; files are stored under `extension`
+FileFormat = namedtuple("FileFormat", "name kind extension")
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+_formats = []      # (FileFormat or rejection message, matches(head, stream)) in registration order
+_by_extension = {}
+
+
+def register_format(name, kind, extension, matches):
+    """
+    Recognise files for which `matches(head, stream)` is true as `name`.
+    `head` is the first SNIFF_BYTES bytes; `stream` is the whole file, seekable.
+    Formats are tried in registration order.
+    """
+    file_format = FileFormat(name, kind, extension)
+    _formats.append((file_format, matches))
+    _by_extension.setdefault(extension, file_format)
+    return file_format
+
+
+def reject_format(message, matches):
+    """Fail fast on content we recognise but cannot process."""
+    _formats.append((message, matches))
+
+
+def sniff(source):
+    """
+    The FileFormat of a path or seekable binary stream (its position is restored).
+    Raises UnsupportedFormat for rejected or unrecognised content.
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as stream:
+            return sniff(stream)
+
+    position = source.tell()
+    try:
+        head = source.read(SNIFF_BYTES)
+        if not head:
+            raise UnsupportedFormat("File is empty")
+        for file_format, matches in _formats:
+            source.seek(position)
+            if matches(head, source):
+                if isinstance(file_format, str):
+                    raise UnsupportedFormat(file_format)
+                return file_format
+    finally:
+        source.seek(position)
+    raise UnsupportedFormat("Unrecognised file content")
+
+
+def kind_of(path):
+    """Extractor kind for a stored upload, whose extension was set from `sniff`."""
+    file_format = _by_extension.get(Path(path).suffix.lower())
+    return file_format.kind if file_format else None
+
+
+# === SIGNATURES ===
+def _zip_contains(member):
+    def matches(head, stream):
+        if not head.startswith(b"PK\x03\x04"):
+            return False
+        try:
+            with zipfile.ZipFile(stream) as archive:
+                archive.getinfo(member)  # Reads only the central directory
+            return True
+        except (zipfile.BadZipFile, KeyError):
+            return False
+    return matches
+
+
+def _is_utf8_text(head, stream):
+    if b"\x00" in head:
+        return False
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head)  # A sequence cut off at the end is fine
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _stream_size(stream):
+    start = stream.tell()
+    end = stream.seek(0, io.SEEK_END)
+    stream.seek(start)
+    return end - start
+
+
+# A header at the very start (after an optional BOM or whitespace), not "%PDF-" quoted in some text
+_PDF_HEADER = re.compile(rb"(?:\xef\xbb\xbf)?[ \t\r\n]{0,16}%PDF-\d\.\d")
+
+
+def _is_pdf(head, stream):
+    return _PDF_HEADER.match(head) is not None
+
+
+def _is_bmp(head, stream):
+    # "BM", then the file size, and a DIB header of one of the known sizes
+    if head[:2] != b"BM" or len(head) < 26:
+        return False
+    file_size = int.from_bytes(head[2:6], "little")
+    pixel_offset = int.from_bytes(head[10:14], "little")
+    dib_size = int.from_bytes(head[14:18], "little")
+    return (dib_size in (12, 40, 108, 124) and file_size == _stream_size(stream)
+            and 14 + dib_size <= pixel_offset < file_size)
+
+
+def _is_gif(head, stream):
+    # Binary image data follows the 13-byte header; a text note that opens with "GIF89a" has none
+    return head[:6] in (b"GIF87a", b"GIF89a") and len(head) >= 13 and not _is_utf8_text(head, stream)
+
+
+def _is_webp(head, stream):
+    # RIFF size covers the whole file, and the first chunk is a VP8 bitstream
+    if head[:4] != b"RIFF" or head[8:12] != b"WEBP" or head[12:16] not in (b"VP8 ", b"VP8L", b"VP8X"):
+        return False
+    return int.from_bytes(head[4:8], "little") + 8 <= _stream_size(stream)
+
+
+def _is_tiff(head, stream):
+    # Byte order mark, magic 42, then the offset of the first IFD, inside the file
+    if head[:4] == b"II*\x00":
+        first_ifd = int.from_bytes(head[4:8], "little")
+    elif head[:4] == b"MM\x00*":
+        first_ifd = int.from_bytes(head[4:8], "big")
+    else:
+        return False
+    return 8 <= first_ifd < _stream_size(stream)
+
+
+reject_format("Legacy Word/Office (.doc) files are not supported; save as .docx or PDF",
+              lambda head, stream: head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"))
+reject_format("RTF files are not supported; save as .docx or PDF",
+              lambda head, stream: head.startswith(b"{\\rtf"))
+reject_format("HEIC photos are not supported; export as JPEG",
+              lambda head, stream: head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1", b"msf1"))
+
+register_format("pdf", "pdf", ".pdf", _is_pdf)
+register_format("docx", "docx", ".docx", _zip_contains("word/document.xml"))
+reject_format("Zip archives other than .docx are not supported",
+              lambda head, stream: head.startswith(b"PK\x03\x04"))
+
+register_format("png", "image", ".png", lambda head, stream: head.startswith(b"\x89PNG\r\n\x1a\n"))
+register_format("jpeg", "image", ".jpg", lambda head, stream: head.startswith(b"\xff\xd8\xff"))
+register_format("gif", "image", ".gif", _is_gif)
+register_format("webp", "image", ".webp", _is_webp)
+register_format("tiff", "image", ".tiff", _is_tiff)
+register_format("bmp", "image", ".bmp", _is_bmp)
+
+register_format("text", "text", ".txt", _is_utf8_text)
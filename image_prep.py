@@ -0,0 +1,164 @@
+"""
+NoteBot Image Preprocessing
+Shrinks phone photos before they are base64-encoded for the vision model:
+EXIF rotation, grayscale, contrast normalisation and a resolution cap.
+Uses OpenCV's CLAHE for contrast when it is installed, Pillow otherwise.
+Large whiteboard and poster shots can instead be cut into overlapping
+tiles that are transcribed separately and stitched back together.
+"""
+
+import difflib
+import io
+import math
+import time
+
+from PIL import Image, ImageOps
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:  # opencv-python is optional
+    cv2 = None
+
+
+def normalize_contrast(image):
+    """Even out lighting and ink contrast on a grayscale image."""
+    if cv2 is not None:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        return Image.fromarray(clahe.apply(np.asarray(image)))
+    return ImageOps.autocontrast(image, cutoff=1)
+
+
+def preprocess_for_ocr(image_bytes, max_side=1600, quality=85):
+    """
+    Return (bytes, stats) for an OCR-ready version of the image.
+    Falls back to the original bytes when processing would not make them smaller.
+    """
+    started = time.perf_counter()
+    with Image.open(io.BytesIO(image_bytes)) as original:
+        original_size = original.size
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("L")
+
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    image = normalize_contrast(image)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    processed = buffer.getvalue()
+
+    processed_size = image.size
+    if len(processed) >= len(image_bytes):
+        processed, processed_size = image_bytes, original_size
+
+    stats = {
+        "engine": "opencv" if cv2 is not None else "pillow",
+        "original_size": list(original_size),
+        "processed_size": list(processed_size),
+        "original_bytes": len(image_bytes),
+        "processed_bytes": len(processed),
+        "bytes_saved": len(image_bytes) - len(processed),
+        "preprocess_seconds": round(time.perf_counter() - started, 3),
+    }
+    return processed, stats
+
+
+# === TILING FOR LARGE IMAGES ===
+def image_dimensions(image_bytes):
+    """(width, height) from the image header, without decoding the pixels."""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return image.size
+
+
+def _tile_starts(length, tile_size, overlap):
+    """Evenly spaced tile offsets along one axis with at least `overlap` shared between neighbours."""
+    if length <= tile_size:
+        return [0]
+    step = tile_size * (1 - overlap)
+    count = math.ceil((length - tile_size) / step) + 1
+    return [round(index * (length - tile_size) / (count - 1)) for index in range(count)]
+
+
+def split_into_tiles(image_bytes, tile_size=1600, overlap=0.15, quality=95):
+    """
+    Cut an EXIF-rotated image into overlapping JPEG tiles.
+    Returns a list of columns (left to right), each a list of tiles (top to bottom).
+    """
+    with Image.open(io.BytesIO(image_bytes)) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    width, height = image.size
+    columns = []
+    for left in _tile_starts(width, tile_size, overlap):
+        column = []
+        for top in _tile_starts(height, tile_size, overlap):
+            tile = image.crop((left, top, min(left + tile_size, width), min(top + tile_size, height)))
+            buffer = io.BytesIO()
+            tile.save(buffer, format="JPEG", quality=quality)
+            column.append(buffer.getvalue())
+        columns.append(column)
+    return columns
+
+
+def _same_line(a, b):
+    return difflib.SequenceMatcher(None, a, b).ratio() >= 0.8
+
+
+def _overlap_length(previous, following, limit):
+    """Largest k such that the last k lines of `previous` match the first k of `following`."""
+    for k in range(min(limit, len(previous), len(following)), 0, -1):
+        if all(_same_line(a, b) for a, b in zip(previous[-k:], following[:k])):
+            return k
+    return 0
+
+
+def _join_fragments(left, right, min_chars=5, slack=2):
+    """
+    `left` and `right` as one line when the end of `left` and the start of
+    `right` are the same text read twice (the strip shared by horizontally
+    adjacent tiles), writing that text once; None if they don't overlap.
+    `slack` characters at the seam are allowed for letters cut by the tile edge.
+    """
+    a, b = left.lower(), right.lower()
+    match = difflib.SequenceMatcher(None, a, b, autojunk=False).find_longest_match(0, len(a), 0, len(b))
+    if match.size < min(min_chars, len(a), len(b)) or match.size == 0:
+        return None
+    if len(a) - (match.a + match.size) > slack or match.b > slack:
+        return None
+    return left[:match.a + match.size] + right[match.b + match.size:]
+
+
+def _merge_row(left_lines, right_lines):
+    """Lines of two horizontally adjacent tiles, with lines crossing the seam rejoined, in reading order."""
+    merged = list(left_lines)
+    position = 0
+    for line in right_lines:
+        for index in range(position, len(merged)):
+            joined = _join_fragments(merged[index], line)
+            if joined is not None:
+                merged[index] = joined
+                position = index + 1
+                break
+        else:
+            merged.insert(position, line)  # Text only the right-hand tile saw
+            position += 1
+    return merged
+
+
+def stitch_transcriptions(columns, max_overlap_lines=6):
+    """
+    Join tile transcriptions row by row. Within a row, lines cut by a vertical
+    tile boundary are rejoined with the overlapping fragment written once;
+    rows are then stacked, dropping lines that were read twice because they
+    sat in the overlap between vertically adjacent tiles.
+    """
+    lines = []
+    for row in zip(*columns):
+        row_lines = []
+        for text in row:
+            row_lines = _merge_row(row_lines, [line.rstrip() for line in text.splitlines() if line.strip()])
+        previous = [" ".join(line.lower().split()) for line in lines[-max_overlap_lines:]]
+        candidates = [" ".join(line.lower().split()) for line in row_lines[:max_overlap_lines]]
+        lines.extend(row_lines[_overlap_length(previous, candidates, max_overlap_lines):])
+    return "\n".join(lines)
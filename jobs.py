@@ -0,0 +1,186 @@
+"""
+NoteBot Job Queue
+Runs file processing in a bounded background worker pool so HTTP requests
+return immediately with a job ID that clients can poll.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("notebot")
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting for a worker."""
+
+
+class Job:
+    """A batch of uploaded files processed together, with per-file status."""
+
+    def __init__(self, filenames):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.files = [{"filename": name, "status": "queued"} for name in filenames]
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._events = []
+
+    def set_status(self, status):
+        with self._lock:
+            self.status = status
+            if status == "running":
+                self.started_at = time.time()
+            elif status in ("completed", "failed"):
+                self.finished_at = time.time()
+            self._publish({"event": "done" if self.done else "job", "status": status})
+
+    def add_file(self, filename, **fields):
+        """
+        Append a file to a job whose uploads are still arriving; returns its index.
+        `fields` (e.g. the client's `ref`) are kept on the record and sent with its first event.
+        """
+        with self._lock:
+            record = {"filename": filename, "status": "queued", **fields}
+            self.files.append(record)
+            index = len(self.files) - 1
+            self._publish({"event": "status", "index": index, **record})
+            return index
+
+    def update_file(self, index, **fields):
+        """Merge `fields` into the record of the file at `index`."""
+        with self._lock:
+            record = self.files[index]
+            record.update(fields)
+            if record["status"] in ("success", "failed"):
+                self._publish({"event": "result", "index": index, **record})
+            else:
+                self._publish({"event": "status", "index": index,
+                               "filename": record["filename"], "status": record["status"]})
+
+    def publish_token(self, index, stage, text):
+        """Relay a fragment of model output for the file at `index` to event listeners."""
+        with self._lock:
+            self._publish({"event": "token", "index": index, "stage": stage, "text": text})
+
+    def _publish(self, event):
+        # Caller holds self._lock
+        event["seq"] = len(self._events)
+        self._events.append(event)
+        self._changed.notify_all()
+
+    def iter_events(self, after=0, heartbeat=15):
+        """
+        Yield job events from sequence number `after` onwards as they happen,
+        finishing after the "done" event. Yields None every `heartbeat`
+        seconds of silence so streaming responses can send keep-alives.
+        """
+        cursor = after
+        while True:
+            with self._changed:
+                if cursor >= len(self._events) and not self.done:
+                    self._changed.wait(heartbeat)
+                pending = self._events[cursor:]
+                finished = self.done
+            cursor += len(pending)
+
+            if not pending and not finished:
+                yield None
+            yield from pending
+            if finished:
+                return
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    def summary(self):
+        """Lightweight status view: per-file state without the note bodies."""
+        with self._lock:
+            files = [
+                {key: value for key, value in record.items()
+                 if key in ("filename", "status", "error")}
+                for record in self.files
+            ]
+            counts = {}
+            for record in files:
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "counts": counts,
+                "files": files,
+            }
+
+    def results(self):
+        """Full per-file results, including enhanced notes once available."""
+        with self._lock:
+            return [dict(record) for record in self.files]
+
+
+class JobQueue:
+    """
+    Bounded pool of worker threads plus an in-memory job registry.
+    Finished jobs are forgotten after `ttl` seconds.
+    """
+
+    def __init__(self, workers=2, max_pending=50, ttl=3600):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notebot-job")
+        self._max_pending = max_pending
+        self._ttl = ttl
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, job, fn, *args):
+        """Queue `fn(job, *args)` on the worker pool. Raises JobQueueFull when saturated."""
+        with self._lock:
+            self._prune()
+            if self._pending >= self._max_pending:
+                raise JobQueueFull(f"{self._pending} jobs already waiting")
+            self._pending += 1
+            self._jobs[job.id] = job
+
+        self._executor.submit(self._run, job, fn, *args)
+        return job
+
+    def track(self, job):
+        """Register a job that runs without a worker, so it can be polled like any other."""
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {"pending": self._pending, "tracked": len(self._jobs)}
+
+    def _run(self, job, fn, *args):
+        with self._lock:
+            self._pending -= 1
+        job.set_status("running")
+        try:
+            fn(job, *args)
+            job.set_status("completed")
+        except Exception:
+            logger.exception(f"💥 Job {job.id} crashed")
+            job.set_status("failed")
+
+    def _prune(self):
+        cutoff = time.time() - self._ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,175 @@
+"""
+NoteBot Ollama Client
+One pooled, keep-alive HTTP session for every call to the Ollama API,
+with retries on connection failures and per-model timing metrics taken
+from Ollama's own response fields.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Fields Ollama reports on every completed generation (durations in nanoseconds)
+METRIC_FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "eval_count",
+                 "prompt_eval_duration", "eval_duration")
+
+DEFAULT_PORT = 11434
+
+
+def normalize_host(host):
+    """
+    Base URL for an OLLAMA_HOST value. Ollama itself accepts the variable
+    without a scheme ("0.0.0.0:11434", "localhost"), meaning plain http on
+    the default port unless one is given, as Ollama reads it.
+    """
+    host = host.strip().rstrip("/")
+    if "://" in host:
+        return host
+    if urlsplit(f"http://{host}").port is None:
+        host = f"{host}:{DEFAULT_PORT}"
+    return f"http://{host}"
+
+
+class OllamaClient:
+    """
+    Thin wrapper over a shared `requests.Session`.
+    Connection errors and 502/503/504 answers are retried with backoff;
+    read timeouts are not, since the model may already have done the work.
+    """
+
+    def __init__(self, host="http://localhost:11434", connect_timeout=5, read_timeout=600,
+                 retries=2, pool_size=10):
+        self.host = normalize_host(host)
+        self.timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=None,  # Generation is safe to resend when it never reached the model
+            backoff_factor=0.5,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._recent = deque(maxlen=50)
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """
+        Client for OLLAMA_HOST with the NOTEBOT_OLLAMA_CONNECT_TIMEOUT,
+        NOTEBOT_OLLAMA_READ_TIMEOUT and NOTEBOT_OLLAMA_RETRIES settings, so the
+        app and the launcher's checks talk to Ollama the same way.
+        """
+        return cls(
+            os.environ.get("OLLAMA_HOST", "http://localhost:11434"),
+            connect_timeout=float(os.environ.get("NOTEBOT_OLLAMA_CONNECT_TIMEOUT", 5)),
+            read_timeout=float(os.environ.get("NOTEBOT_OLLAMA_READ_TIMEOUT", 600)),
+            retries=int(os.environ.get("NOTEBOT_OLLAMA_RETRIES", 2)),
+            **kwargs,
+        )
+
+    # === API CALLS ===
+    def tags(self, timeout=10):
+        """Models installed on the server."""
+        return self._get("/api/tags", timeout).get("models", [])
+
+    def ps(self, timeout=2):
+        """Models currently loaded in memory."""
+        return self._get("/api/ps", timeout).get("models", [])
+
+    def generate(self, payload, on_token=None):
+        """
+        Call /api/generate and return the full response text.
+        With `on_token`, uses Ollama's streaming API and passes each text
+        fragment to the callback as soon as it is generated.
+        """
+        model = payload.get("model")
+        started = time.perf_counter()
+        try:
+            if on_token is None:
+                final = self._generate_once(payload)
+                text = final.get("response", "")
+            else:
+                text, final = self._generate_stream(payload, on_token)
+        except Exception:
+            self._record(model, {}, time.perf_counter() - started, failed=True)
+            raise
+        self._record(model, final, time.perf_counter() - started)
+        return text
+
+    def _get(self, path, timeout):
+        response = self.session.get(f"{self.host}{path}", timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _generate_once(self, payload):
+        response = self.session.post(f"{self.host}/api/generate", json={**payload, "stream": False},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _generate_stream(self, payload, on_token):
+        pieces = []
+        final = {}
+        with self.session.post(f"{self.host}/api/generate", json={**payload, "stream": True},
+                               timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise requests.exceptions.RequestException(chunk["error"])
+                piece = chunk.get("response", "")
+                if piece:
+                    pieces.append(piece)
+                    on_token(piece)
+                if chunk.get("done"):
+                    final = chunk
+                    break
+        return "".join(pieces), final
+
+    # === METRICS ===
+    def _record(self, model, final, wall_seconds, failed=False):
+        sample = {field: final.get(field, 0) for field in METRIC_FIELDS}
+        with self._lock:
+            totals = self._totals.setdefault(model, {"calls": 0, "errors": 0, "wall_seconds": 0.0,
+                                                     **{field: 0 for field in METRIC_FIELDS}})
+            totals["calls"] += 1
+            totals["errors"] += failed
+            totals["wall_seconds"] += wall_seconds
+            for field, value in sample.items():
+                totals[field] += value
+            self._recent.append({"model": model, "at": time.time(), "failed": failed,
+                                 "wall_seconds": round(wall_seconds, 3), **sample})
+
+    def metrics(self):
+        """Per-model totals and averages, plus the most recent calls."""
+        with self._lock:
+            models = {}
+            for model, totals in self._totals.items():
+                ok_calls = max(totals["calls"] - totals["errors"], 1)
+                models[model] = {
+                    **totals,
+                    "avg_wall_seconds": totals["wall_seconds"] / totals["calls"],
+                    "avg_load_seconds": totals["load_duration"] / ok_calls / 1e9,
+                    "avg_total_seconds": totals["total_duration"] / ok_calls / 1e9,
+                    "eval_tokens_per_second": (totals["eval_count"] / (totals["eval_duration"] / 1e9)
+                                               if totals["eval_duration"] else None),
+                }
+            return {"models": models, "recent": list(self._recent)}
@@ -0,0 +1,125 @@
+"""
+NoteBot PDF Extraction
+Per-page text extraction, streamed a page at a time, that flags pages
+without a usable text layer (scanned pages) and renders just those pages
+to images for vision OCR. Long documents can be sharded by page range
+across a process pool, since PyPDF2 text extraction is CPU-bound.
+Rendering uses PyMuPDF when installed; otherwise the largest image
+embedded in the page (usually the scan itself) is used.
+"""
+
+import base64
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+try:
+    import pymupdf as fitz
+except ImportError:  # PyMuPDF is optional; releases before 1.24.3 only provide `fitz`
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+
+
+def page_count(filepath):
+    return len(PyPDF2.PdfReader(str(filepath)).pages)
+
+
+def _page(text, min_chars):
+    """(text, needs_ocr): a page with less than `min_chars` of text is probably a scan, but keeps what it has."""
+    text = text or ""
+    return text, len(text.strip()) < min_chars
+
+
+def extract_page_range(filepath, start, stop, min_chars=20):
+    """(text, needs_ocr) of pages [start, stop). Top-level so process-pool workers can run it."""
+    with open(filepath, "rb") as stream:
+        reader = PyPDF2.PdfReader(stream)
+        return [_page(reader.pages[index].extract_text(), min_chars) for index in range(start, stop)]
+
+
+def iter_page_texts(filepath, min_chars=20, window=25, pool=None, ahead=4):
+    """
+    Yield (page_index, text, needs_ocr) one page at a time. Pages with fewer
+    than `min_chars` of text need OCR; their text is still passed on, as a
+    fallback should OCR fail.
+
+    PdfReader keeps every object it has parsed, so the reader is reopened
+    every `window` pages to keep memory flat however long the document is.
+    With a process `pool`, `window`-page shards are extracted in parallel,
+    at most `ahead` shards beyond the one being yielded, and yielded in order.
+    """
+    if pool is not None:
+        yield from _iter_sharded(filepath, min_chars, window, pool, ahead)
+        return
+
+    with open(filepath, "rb") as stream:
+        total = len(PyPDF2.PdfReader(stream).pages)
+        for start in range(0, total, window):
+            reader = PyPDF2.PdfReader(stream)
+            for index in range(start, min(start + window, total)):
+                yield (index, *_page(reader.pages[index].extract_text(), min_chars))
+            del reader
+
+
+def _iter_sharded(filepath, min_chars, window, pool, ahead):
+    total = page_count(filepath)
+    starts = iter(range(0, total, window))
+    pending = deque()
+
+    def submit_next():
+        start = next(starts, None)
+        if start is not None:
+            future = pool.submit(extract_page_range, str(filepath), start, min(start + window, total), min_chars)
+            pending.append((start, future))
+
+    try:
+        for _ in range(ahead + 1):
+            submit_next()
+        while pending:
+            start, future = pending.popleft()
+            texts = future.result()
+            submit_next()
+            for offset, (text, needs_ocr) in enumerate(texts):
+                yield start + offset, text, needs_ocr
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def iter_page_texts_sharded(filepath, min_chars=20, processes=2, shard_pages=10):
+    """iter_page_texts across a private process pool, for callers that have none (e.g. a sandboxed child)."""
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        yield from iter_page_texts(filepath, min_chars, window=shard_pages, pool=pool, ahead=2 * processes)
+
+
+def page_texts(filepath):
+    """Text layer of every page in order, however little there is (no OCR)."""
+    return [text for _, text, _ in iter_page_texts(filepath)]
+
+
+def render_page(filepath, page_index, dpi=200):
+    """PNG/JPEG bytes of one page, suitable for OCR. Raises ValueError if it cannot be rendered."""
+    if fitz is not None:
+        with fitz.open(str(filepath)) as document:
+            pixmap = document[page_index].get_pixmap(dpi=dpi)
+            return pixmap.tobytes("png")
+
+    page = PyPDF2.PdfReader(str(filepath)).pages[page_index]
+    images = list(page.images)
+    if not images:
+        raise ValueError("page has no text layer and no embedded image (install PyMuPDF to render it)")
+    return max(images, key=lambda image: len(image.data)).data
+
+
+def render_page_base64(filepath, page_index, dpi=200):
+    """render_page for the extraction sandbox, whose JSON protocol can't carry raw bytes."""
+    return base64.b64encode(render_page(filepath, page_index, dpi)).decode("ascii")
+
+
+def rendering_engine():
+    return "pymupdf" if fitz is not None else "embedded-image"
+
@@ -0,0 +1,80 @@
+"""
+NoteBot Processing Pipeline
+Each stage (extract, OCR, structuring) owns a queue and a pool of worker
+threads, so CPU parsing, vision inference and text inference overlap
+across files and across users. Stages keep counters for sizing their pools.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger("notebot")
+
+
+class Stage:
+    """
+    A named work queue drained by its own worker threads.
+    `handler(task)` does the stage's work and hands the task on to the next
+    stage itself; if it raises, `on_error(task, exc)` is called instead.
+    """
+
+    def __init__(self, name, workers, handler, on_error=None):
+        self.name = name
+        self.workers = workers
+        self._handler = handler
+        self._on_error = on_error
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self._processed = 0
+        self._failed = 0
+        self._started_at = time.time()
+
+        for number in range(workers):
+            threading.Thread(target=self._work, name=f"notebot-{name}-{number}", daemon=True).start()
+
+    def put(self, task):
+        self._queue.put(task)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            with self._lock:
+                self._busy += 1
+            started = time.perf_counter()
+            failed = False
+            try:
+                self._handler(task)
+            except Exception as e:
+                failed = True
+                logger.exception(f"💥 {self.name} stage failed")
+                if self._on_error is not None:
+                    self._on_error(task, e)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._busy_seconds += time.perf_counter() - started
+                    self._processed += 1
+                    self._failed += failed
+                self._queue.task_done()
+
+    def stats(self):
+        with self._lock:
+            uptime = max(time.time() - self._started_at, 1e-9)
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "busy": self._busy,
+                "utilisation": self._busy / self.workers,
+                "lifetime_utilisation": self._busy_seconds / (self.workers * uptime),
+                "processed": self._processed,
+                "failed": self._failed,
+                "avg_seconds": self._busy_seconds / self._processed if self._processed else None,
+            }
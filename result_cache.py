@@ -0,0 +1,130 @@
+"""
+NoteBot Result Cache
+Persistent, size-bounded LRU cache backed by SQLite so every gunicorn
+worker (and every restart) shares the same cached model outputs.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+def cache_key(*parts):
+    """Stable SHA-256 key over any JSON-serialisable parts."""
+    encoded = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Key/value store of model outputs. Entries are evicted least-recently-used
+    first once the total stored size exceeds `max_bytes`, and, when `max_age`
+    (seconds) is set, once they are older than that. Hit and miss counters
+    live in the same database so they aggregate across processes.
+    """
+
+    def __init__(self, db_path, max_bytes, max_age=None):
+        self.db_path = str(db_path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._init_lock = threading.Lock()
+        self._initialised = False
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with self._init_lock:
+                if not self._initialised:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS entries ("
+                        " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                        " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+                    )
+                    self._initialised = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _bump(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._expired(row[1]):
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._bump(conn, "expirations")
+                row = None
+            if row is None:
+                self._bump(conn, "misses")
+                return None
+            conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._bump(conn, "hits")
+            return row[0]
+
+    def set(self, key, value):
+        """Store `value` under `key`, then evict old entries until under budget."""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(conn)
+
+    def _expired(self, created_at):
+        return self.max_age is not None and created_at < time.time() - self.max_age
+
+    def _evict(self, conn):
+        if self.max_age is not None:
+            expired = conn.execute(
+                "DELETE FROM entries WHERE created_at < ?", (time.time() - self.max_age,)
+            ).rowcount
+            if expired:
+                self._bump(conn, "expirations", expired)
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+        self._bump(conn, "evictions", len(stale))
+
+    def stats(self):
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters"))
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "expirations": counters.get("expirations", 0),
+        }
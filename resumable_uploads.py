@@ -0,0 +1,164 @@
+"""
+NoteBot Resumable Uploads
+Upload sessions for large files over flaky connections: the client
+declares the file, sends chunks at explicit byte offsets (in any order,
+several at once), asks which ranges have arrived after a failure, and
+finalises once everything is there. Session state lives on disk, so an
+interrupted upload can resume after a page reload or a server restart.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UnknownUpload(KeyError):
+    pass
+
+
+class InvalidChunk(ValueError):
+    pass
+
+
+class IncompleteUpload(ValueError):
+    pass
+
+
+def merge_ranges(ranges):
+    """Sorted, non-overlapping [start, end) ranges covering the same bytes."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class UploadSessions:
+    """
+    One directory per session under `root`, holding `state.json` and a
+    sparse `data` file that chunks are written into at their offsets.
+    Sessions untouched for `ttl` seconds are removed.
+    """
+
+    def __init__(self, root, ttl=24 * 3600):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _dir(self, upload_id):
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id or ""):
+            raise UnknownUpload(upload_id)
+        return self.root / upload_id
+
+    def _load(self, upload_id):
+        try:
+            return json.loads((self._dir(upload_id) / "state.json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise UnknownUpload(upload_id) from None
+
+    def _save(self, state):
+        session_dir = self._dir(state["upload_id"])
+        state["updated_at"] = time.time()
+        temp = session_dir / "state.json.tmp"
+        temp.write_text(json.dumps(state), encoding="utf-8")
+        os.replace(temp, session_dir / "state.json")
+
+    def data_path(self, upload_id):
+        return self._dir(upload_id) / "data"
+
+    def create(self, filename, size):
+        self.prune()
+        upload_id = uuid.uuid4().hex
+        session_dir = self._dir(upload_id)
+        session_dir.mkdir()
+        with open(session_dir / "data", "wb") as data:
+            data.truncate(size)
+        state = {"upload_id": upload_id, "filename": filename, "size": size, "received": [],
+                 "finalized": None, "created_at": time.time()}
+        self._save(state)
+        return state
+
+    def status(self, upload_id):
+        state = self._load(upload_id)
+        state["received_bytes"] = sum(end - start for start, end in state["received"])
+        state["complete"] = state["received"] == [[0, state["size"]]] or state["size"] == 0
+        return state
+
+    def write_chunk(self, upload_id, offset, stream):
+        """
+        Write the request body at `offset`. Whatever arrives is recorded,
+        so a chunk cut short by a dropped connection still counts.
+        """
+        state = self._load(upload_id)
+        if state["finalized"]:
+            raise InvalidChunk("Upload is already finalised")
+        if offset < 0 or offset > state["size"]:
+            raise InvalidChunk(f"Offset {offset} is outside the file")
+
+        position = offset
+        try:
+            # Each request writes through its own handle, so concurrent chunks don't share a file position
+            with open(self.data_path(upload_id), "r+b") as data:
+                data.seek(offset)
+                for block in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    if position + len(block) > state["size"]:
+                        raise InvalidChunk("Chunk runs past the declared file size")
+                    data.write(block)
+                    position += len(block)
+        finally:
+            if position > offset:
+                with self._lock:
+                    state = self._load(upload_id)
+                    state["received"] = merge_ranges(state["received"] + [[offset, position]])
+                    self._save(state)
+        return self.status(upload_id)
+
+    def assemble(self, upload_id):
+        """(data path, SHA-256) of a fully received upload; raises IncompleteUpload otherwise."""
+        state = self.status(upload_id)
+        if not state["complete"]:
+            missing = state["size"] - state["received_bytes"]
+            raise IncompleteUpload(f"{missing} bytes have not arrived yet")
+        digest = hashlib.sha256()
+        with open(self.data_path(upload_id), "rb") as data:
+            for block in iter(lambda: data.read(CHUNK_SIZE), b""):
+                digest.update(block)
+        return self.data_path(upload_id), digest.hexdigest()
+
+    def mark_finalized(self, upload_id, **result):
+        with self._lock:
+            state = self._load(upload_id)
+            state["finalized"] = result
+            self._save(state)
+        return state
+
+    def finalized(self, upload_id):
+        """The stored result of a finalised upload; raises IncompleteUpload if not finalised yet."""
+        state = self._load(upload_id)
+        if not state["finalized"]:
+            raise IncompleteUpload("Upload has not been finalised")
+        return state["finalized"]
+
+    def discard(self, upload_id):
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        for session_dir in self.root.iterdir():
+            state_file = session_dir / "state.json"
+            try:
+                if state_file.stat().st_mtime < cutoff:
+                    shutil.rmtree(session_dir, ignore_errors=True)
+            except FileNotFoundError:
+                continue
@@ -0,0 +1,171 @@
+"""
+NoteBot Extraction Sandbox
+Runs document parsers in a child process with limits on address space
+and CPU time and a wall-clock timeout, so a pathological PDF or a
+zip-bomb DOCX fails on its own instead of stalling an extract worker.
+rlimits need the POSIX `resource` module; elsewhere only the timeout applies.
+
+The child is this file run as a script: it reads one JSON request on
+stdin, calls a top-level function, and writes JSON lines back.
+"""
+
+import importlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class ExtractionFailed(Exception):
+    """A sandboxed call that did not finish; `reason` is timeout, memory, cpu, crashed or error."""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+    def details(self):
+        return {"reason": self.reason, "message": str(self)}
+
+
+class Sandbox:
+    """
+    Calls `function(*args)` in a fresh child process. Functions must be
+    top-level in an importable module; arguments and results must be JSON.
+    `timeout` counts only time spent waiting on the child, so a slow
+    consumer of `stream()` does not use it up.
+    """
+
+    def __init__(self, memory_mb=1024, cpu_seconds=120, timeout=180):
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.timeout = timeout
+
+    def call(self, function, *args):
+        """Return `function(*args)`, or raise ExtractionFailed."""
+        return list(self._run(function, args, stream=False))[0]
+
+    def stream(self, function, *args):
+        """Yield the items of generator `function(*args)` as the child produces them."""
+        yield from self._run(function, args, stream=True)
+
+    def _run(self, function, args, stream):
+        request = {
+            "target": f"{function.__module__}:{function.__qualname__}",
+            "args": list(args),
+            "stream": stream,
+            "memory_mb": self.memory_mb,
+            "cpu_seconds": self.cpu_seconds,
+        }
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   start_new_session=hasattr(os, "killpg"))
+        process.stdin.write(json.dumps(request).encode("utf-8"))
+        process.stdin.close()
+
+        state = {"deadline": time.monotonic() + self.timeout, "timed_out": False}
+        finished = threading.Event()
+
+        def watchdog():
+            while not finished.wait(0.25):
+                if time.monotonic() > state["deadline"]:
+                    state["timed_out"] = True
+                    self._kill(process)
+                    return
+
+        threading.Thread(target=watchdog, name="notebot-sandbox-watchdog", daemon=True).start()
+        complete = False
+        try:
+            while True:
+                state["deadline"] = time.monotonic() + self.timeout
+                line = process.stdout.readline()
+                state["deadline"] = float("inf")
+                if not line:
+                    break
+                message = json.loads(line)
+                if "error" in message:
+                    raise ExtractionFailed(message["reason"], message["error"])
+                if "item" in message:
+                    yield message["item"]
+                elif "result" in message:
+                    complete = True
+                    yield message["result"]
+                elif message.get("done"):
+                    complete = True
+        finally:
+            finished.set()
+            if process.poll() is None:
+                self._kill(process)  # The consumer stopped early, or the child failed
+            process.wait()
+            process.stdout.close()
+
+        if state["timed_out"]:
+            raise ExtractionFailed("timeout", f"No progress for {self.timeout}s")
+        if not complete:
+            raise ExtractionFailed(*self._exit_reason(process.returncode))
+
+    @staticmethod
+    def _kill(process):
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)  # Includes any pool the child started
+            else:
+                process.kill()
+        except ProcessLookupError:
+            pass
+
+    def _exit_reason(self, returncode):
+        if hasattr(signal, "SIGXCPU") and returncode == -signal.SIGXCPU:
+            return "cpu", f"Exceeded {self.cpu_seconds}s of CPU time"
+        if returncode < 0:
+            return "crashed", f"Parser killed by {signal.Signals(-returncode).name}"
+        return "crashed", f"Parser exited with status {returncode}"
+
+
+# === CHILD PROCESS ===
+def limit_resources(memory_mb, cpu_seconds):
+    if resource is None:
+        return
+    for limit, soft, hard in ((resource.RLIMIT_AS, memory_mb * 1024 * 1024, memory_mb * 1024 * 1024),
+                              (resource.RLIMIT_CPU, cpu_seconds, cpu_seconds + 5)):
+        _, current_hard = resource.getrlimit(limit)
+        if current_hard != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current_hard), min(hard, current_hard)
+        resource.setrlimit(limit, (soft, hard))
+
+
+def _child():
+    request = json.load(sys.stdin)
+    # Keep the protocol on the original stdout; anything the parsers print goes to stderr
+    out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)
+
+    def send(message):
+        out.write(json.dumps(message) + "\n")
+        out.flush()
+
+    limit_resources(request["memory_mb"], request["cpu_seconds"])
+    try:
+        module_name, function_name = request["target"].split(":")
+        function = getattr(importlib.import_module(module_name), function_name)
+        if request["stream"]:
+            for item in function(*request["args"]):
+                send({"item": item})
+            send({"done": True})
+        else:
+            send({"result": function(*request["args"])})
+    except MemoryError:
+        send({"reason": "memory", "error": f"Exceeded {request['memory_mb']}MB of memory"})
+    except Exception as e:
+        send({"reason": "error", "error": f"{type(e).__name__}: {e}"})
+
+
+if __name__ == "__main__":
+    _child()
@@ -0,0 +1,145 @@
+"""
+NoteBot Model Scheduler
+Hands out Ollama call slots in model-homogeneous batches. On a single
+Ollama box, alternating vision and text calls forces the runtime to evict
+and reload models; draining all pending calls for one model before
+switching keeps load_duration near zero for most calls.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ModelScheduler:
+    """
+    Counting semaphore over `slots` concurrent model calls that only admits
+    calls for one model at a time.
+
+    - Calls for the active model are admitted while slots are free, up to
+      `max_batch` in a row when other models are waiting (so nobody starves).
+    - The scheduler switches models only once in-flight calls have drained and
+      the active model has no waiting callers and no queued backlog
+      (`pending(model)`), or has lingered idle for `linger` seconds.
+    - When several models are waiting, one Ollama already holds in memory
+      (`resident()`, e.g. from /api/ps) wins; otherwise the oldest waiter wins.
+      `resident()` is called at most every RESIDENT_TTL seconds, on a
+      background thread, so a slow Ollama never holds up the lock.
+    """
+
+    RESIDENT_TTL = 5.0
+
+    def __init__(self, slots, max_batch=8, linger=1.0, pending=None, resident=None):
+        self.slots = slots
+        self.max_batch = max_batch
+        self.linger = linger
+        self._pending = pending or (lambda model: 0)
+        self._resident = resident
+        self._cond = threading.Condition()
+        self._active = None
+        self._in_use = 0
+        self._batch = 0
+        self._waiting = {}
+        self._last_release = 0.0
+        self._resident_cache = (0.0, set())
+        self._refreshing = False
+        self._switches = 0
+        self._grants = {}
+
+    @contextmanager
+    def slot(self, model):
+        """Hold a call slot for `model` for the duration of the block."""
+        self.acquire(model)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    def acquire(self, model):
+        ticket = object()
+        with self._cond:
+            self._waiting.setdefault(model, {})[ticket] = time.monotonic()
+            self._cond.notify_all()
+            try:
+                while not self._may_run(model):
+                    self._cond.wait(self.linger)
+            finally:
+                del self._waiting[model][ticket]
+
+            if model != self._active:
+                if self._active is not None:
+                    self._switches += 1
+                self._active = model
+                self._batch = 0
+            self._in_use += 1
+            self._batch += 1
+            self._grants[model] = self._grants.get(model, 0) + 1
+
+    def release(self, model):
+        with self._cond:
+            self._in_use -= 1
+            self._last_release = time.monotonic()
+            self._cond.notify_all()
+
+    def _others_waiting(self, model):
+        return any(tickets for other, tickets in self._waiting.items() if other != model)
+
+    def _may_run(self, model):
+        if self._in_use >= self.slots:
+            return False
+        if model == self._active:
+            return self._batch < self.max_batch or not self._others_waiting(model)
+        return self._in_use == 0 and self._should_switch() and self._next_model() == model
+
+    def _should_switch(self):
+        active = self._active
+        if active is None:
+            return True
+        if self._batch >= self.max_batch:
+            return True
+        if self._waiting.get(active):
+            return False
+        idle_for = time.monotonic() - self._last_release
+        return self._pending(active) == 0 or idle_for >= self.linger
+
+    def _next_model(self):
+        candidates = {model: min(tickets.values()) for model, tickets in self._waiting.items()
+                      if tickets and model != self._active}
+        if not candidates:
+            return self._active
+        if len(candidates) > 1:
+            resident = [model for model in candidates if model in self._resident_models()]
+            if resident:
+                candidates = {model: candidates[model] for model in resident}
+        return min(candidates, key=candidates.get)
+
+    def _resident_models(self):
+        # Called with the lock held: answer from the cache and refresh it in the background
+        if self._resident is None:
+            return set()
+        fetched_at, models = self._resident_cache
+        if time.monotonic() - fetched_at > self.RESIDENT_TTL and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_resident, name="notebot-resident", daemon=True).start()
+        return models
+
+    def _refresh_resident(self):
+        models = set()
+        try:
+            models = set(self._resident())
+        finally:
+            with self._cond:
+                self._resident_cache = (time.monotonic(), models)
+                self._refreshing = False
+                self._cond.notify_all()  # Waiters re-pick the next model with the fresh set
+
+    def stats(self):
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "active_model": self._active,
+                "in_use": self._in_use,
+                "waiting": {model: len(tickets) for model, tickets in self._waiting.items() if tickets},
+                "switches": self._switches,
+                "grants": dict(self._grants),
+            }
@@ -19,6 +19,10 @@ os.chdir(project_root)
 # Add project root to Python path
 sys.path.insert(0, str(project_root))
 
+from ollama_client import OllamaClient
+
+ollama = OllamaClient.from_env()
+
 # === LOGGING FUNCTION ===
 def log(message, level="INFO"):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -55,8 +59,7 @@ def check_dependencies():
         "mammoth": "mammoth",
         "PyPDF2": "PyPDF2",
         "PIL": "Pillow",
-        "werkzeug": "Werkzeug",
-        "docx": "python-docx"
+        "werkzeug": "Werkzeug"
     }
 
     missing = []
@@ -77,13 +80,12 @@ def check_dependencies():
 
 def check_ollama_running():
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=10)
-        if response.status_code == 200:
-            log("✅ Ollama service - OK")
-            return True
-        else:
-            log(f"❌ Ollama responded with status {response.status_code}", "ERROR")
-            return False
+        ollama.tags()
+        log("✅ Ollama service - OK")
+        return True
+    except requests.exceptions.HTTPError as e:
+        log(f"❌ Ollama responded with status {e.response.status_code}", "ERROR")
+        return False
     except requests.exceptions.ConnectionError:
         log("❌ Ollama is not running. Start it with: ollama serve", "ERROR")
         return False
@@ -95,8 +97,7 @@ def check_ollama_running():
 def ensure_models_installed():
     required_models = ["qwen2.5vl:7b", "qwen3:4b"]
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=10)
-        installed_models = [model["name"] for model in response.json().get("models", [])]
+        installed_models = [model["name"] for model in ollama.tags()]
 
         for model in required_models:
             if model not in installed_models:
@@ -0,0 +1,34 @@
+/*
+ * NoteBot image resize worker
+ * Downscales and re-encodes photos off the main thread before they are
+ * uploaded, to the resolution the OCR model actually uses (advertised by
+ * GET /api/image-target). Replies with the original when shrinking would
+ * not make the file smaller, or when the browser cannot decode it.
+ */
+self.onmessage = async (e) => {
+    const { file, maxSide, type, quality } = e.data;
+    try {
+        // Bakes in the EXIF rotation, which the re-encoded file would otherwise lose
+        const bitmap = await createImageBitmap(file, { imageOrientation: "from-image" });
+        const scale = Math.min(1, maxSide / Math.max(bitmap.width, bitmap.height));
+        const width = Math.round(bitmap.width * scale);
+        const height = Math.round(bitmap.height * scale);
+
+        const canvas = new OffscreenCanvas(width, height);
+        const ctx = canvas.getContext("2d");
+        ctx.fillStyle = "#fff";  // JPEG has no alpha: transparent areas become white paper, not black
+        ctx.fillRect(0, 0, width, height);
+        ctx.imageSmoothingQuality = "high";
+        ctx.drawImage(bitmap, 0, 0, width, height);
+        bitmap.close();
+
+        const blob = await canvas.convertToBlob({ type, quality });
+        if (blob.size >= file.size) {
+            self.postMessage({ blob: null });
+        } else {
+            self.postMessage({ blob, width, height });
+        }
+    } catch (err) {
+        self.postMessage({ blob: null, error: String(err) });
+    }
+};
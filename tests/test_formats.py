@@ -0,0 +1,51 @@
+import io
+
+import pytest
+
+from formats import UnsupportedFormat, sniff
+
+
+def sniffed(data):
+    return sniff(io.BytesIO(data)).name
+
+
+@pytest.mark.parametrize("text", [
+    b"BMO budget meeting, 3 March\n- Review capital plan\n",
+    b"BM\n" + b"x" * 40,
+    b"GIF89a is the animated variant.\n",
+    b"RIFF notes: WEBP export is broken\n",
+])
+def test_text_with_image_magic_is_text(text):
+    assert sniffed(text) == "text"
+
+
+def test_text_quoting_pdf_header_is_text():
+    text = b"Minutes\n" + b"a" * 200 + b"\nThe broken file starts with %PDF-1.4 like any other.\n"
+    assert sniffed(text) == "text"
+
+
+def test_pdf_header_at_start():
+    assert sniffed(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n1 0 obj\n") == "pdf"
+    assert sniffed(b"\r\n%PDF-1.4\n") == "pdf"
+
+
+@pytest.mark.parametrize("image_format, name", [
+    ("PNG", "png"), ("JPEG", "jpeg"), ("GIF", "gif"), ("WEBP", "webp"), ("TIFF", "tiff"), ("BMP", "bmp"),
+])
+@pytest.mark.parametrize("size", [(1, 1), (300, 200)])
+def test_images(image_format, name, size):
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, image_format)
+    assert sniffed(buffer.getvalue()) == name
+
+
+def test_truncated_bmp_header_is_rejected():
+    with pytest.raises(UnsupportedFormat):
+        sniffed(b"BM" + (1000).to_bytes(4, "little") + b"\x00" * 4 + (54).to_bytes(4, "little")
+                + (40).to_bytes(4, "little") + b"\x00" * 12)
+
+
+def test_legacy_doc_is_rejected():
+    with pytest.raises(UnsupportedFormat):
+        sniffed(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\x00" * 100)
@@ -0,0 +1,23 @@
+import pytest
+
+from ollama_client import OllamaClient, normalize_host
+
+
+@pytest.mark.parametrize("host, url", [
+    ("0.0.0.0:11434", "http://0.0.0.0:11434"),
+    ("localhost:11434", "http://localhost:11434"),
+    ("localhost", "http://localhost:11434"),
+    ("[::1]:8080", "http://[::1]:8080"),
+    ("http://localhost:11434/", "http://localhost:11434"),
+    ("https://ollama.example.com", "https://ollama.example.com"),
+])
+def test_normalize_host(host, url):
+    assert normalize_host(host) == url
+
+
+def test_from_env_accepts_host_without_scheme(monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOST", "0.0.0.0:11434")
+    monkeypatch.setenv("NOTEBOT_OLLAMA_READ_TIMEOUT", "42")
+    client = OllamaClient.from_env()
+    assert client.host == "http://0.0.0.0:11434"
+    assert client.timeout == (5.0, 42.0)
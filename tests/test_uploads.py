@@ -0,0 +1,114 @@
+import io
+import threading
+import time
+import uuid
+
+import pytest
+
+app_module = pytest.importorskip("app")
+Job = app_module.Job
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Keep stored uploads, cached notes and saved notes out of the project directories
+    monkeypatch.setattr(app_module, "upload_store", app_module.UploadStore(tmp_path / "uploads"))
+    monkeypatch.setattr(app_module, "notes_cache", app_module.ResultCache(tmp_path / "notes.sqlite", max_bytes=1 << 20))
+    monkeypatch.setattr(app_module, "ocr_cache", app_module.ResultCache(tmp_path / "ocr.sqlite", max_bytes=1 << 20))
+    monkeypatch.setattr(app_module, "outputs_dir", tmp_path)
+    return app_module.app.test_client()
+
+
+def test_file_over_spool_limit_is_413(client, monkeypatch):
+    # Per-file limit below MAX_CONTENT_LENGTH, so the spool (not Werkzeug) rejects the file mid-parse
+    monkeypatch.setattr(app_module, "UPLOAD_MAX_MB", 1)
+    monkeypatch.setattr(app_module, "PDF_UPLOAD_MAX_MB", 1)
+    assert app_module.app.config["MAX_CONTENT_LENGTH"] > 2 * 1024 * 1024
+
+    response = client.post("/api/process", data={"files": [(io.BytesIO(b"x" * (2 * 1024 * 1024)), "big.txt")]},
+                           content_type="multipart/form-data")
+    assert response.status_code == 413
+    assert "larger than 1MB" in response.get_json()["error"]
+
+
+def wait_for(job_id, client, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        summary = client.get(f"/api/jobs/{job_id}").get_json()
+        if summary["status"] in ("completed", "failed"):
+            return summary
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_incremental_upload_does_not_need_a_job_worker(client, monkeypatch):
+    monkeypatch.setattr(app_module, "generate_notes", lambda prompt, on_token=None: "# Notes")
+    release = threading.Event()
+    blockers = [Job([]) for _ in range(app_module.JOB_WORKERS)]
+    for blocker in blockers:
+        app_module.job_queue.submit(blocker, lambda job: release.wait(10))
+    try:
+        text = f"Budget meeting {uuid.uuid4().hex}\n- Review the capital plan\n".encode()
+        response = client.post("/api/process?incremental=1",
+                               data={"files": [(io.BytesIO(text), "minutes.txt")]},
+                               content_type="multipart/form-data")
+        assert response.status_code == 202
+        summary = wait_for(response.get_json()["job_id"], client)
+        assert summary["status"] == "completed"
+        assert summary["counts"] == {"success": 1}
+        assert all(blocker.status == "running" for blocker in blockers)
+    finally:
+        release.set()
+
+
+def test_open_job_takes_uploads_from_several_requests(client, monkeypatch):
+    monkeypatch.setattr(app_module, "generate_notes", lambda prompt, on_token=None: "# Notes")
+    opened = client.post("/api/jobs")
+    assert opened.status_code == 201
+    job_id = opened.get_json()["job_id"]
+
+    for ref in ("0", "1"):
+        text = f"Note {ref} {uuid.uuid4().hex}\n".encode()
+        response = client.post(f"/api/process?incremental=1&job_id={job_id}&ref={ref}",
+                               data={"files": [(io.BytesIO(text), f"note{ref}.txt")]},
+                               content_type="multipart/form-data")
+        assert response.status_code == 202
+        assert response.get_json()["job_id"] == job_id
+
+    assert client.post(f"/api/jobs/{job_id}/close").status_code == 200
+    assert wait_for(job_id, client)["counts"] == {"success": 2}
+    results = client.get(f"/api/jobs/{job_id}/results").get_json()["results"]
+    assert [(result["filename"], result["ref"]) for result in results] == [("note0.txt", "0"), ("note1.txt", "1")]
+
+    # Closed: no more uploads
+    response = client.post(f"/api/process?incremental=1&job_id={job_id}",
+                           data={"files": [(io.BytesIO(b"late"), "late.txt")]},
+                           content_type="multipart/form-data")
+    assert response.status_code == 404
+
+
+def test_health_answers_while_an_upload_is_being_processed(client, monkeypatch):
+    # The upload request returns once its body is received, not when the model is done,
+    # so it doesn't hold a server thread through OCR and structuring
+    model_busy, release = threading.Event(), threading.Event()
+
+    def slow_model(prompt, on_token=None):
+        model_busy.set()
+        release.wait(10)
+        return "# Notes"
+
+    monkeypatch.setattr(app_module, "generate_notes", slow_model)
+    try:
+        job_id = client.post("/api/jobs").get_json()["job_id"]
+        text = f"Slow note {uuid.uuid4().hex}\n".encode()
+        response = client.post(f"/api/process?incremental=1&job_id={job_id}&ref=0",
+                               data={"files": [(io.BytesIO(text), "slow.txt")]},
+                               content_type="multipart/form-data")
+        assert response.status_code == 202
+        assert model_busy.wait(5)
+        assert client.get("/health").status_code == 200
+        assert client.get(f"/api/jobs/{job_id}").get_json()["status"] == "running"
+    finally:
+        release.set()
+    client.post(f"/api/jobs/{job_id}/close")
+    assert wait_for(job_id, client)["counts"] == {"success": 1}
@@ -0,0 +1,159 @@
+"""
+NoteBot Upload Store
+Content-addressed storage for uploads: each distinct file is kept once,
+at <root>/ab/cd/<sha256><ext>, whatever it was called and however often
+it is sent. The SHA-256 is computed while the upload is written (by
+HashingSpool when Werkzeug spools it), and an SQLite index maps every
+upload (original filename, time) to its blob.
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+StoredUpload = namedtuple("StoredUpload", "sha256 path size duplicate")
+
+
+class UploadTooLarge(RequestEntityTooLarge):
+    """
+    An HTTP 413 rather than a ValueError: Werkzeug's form parser swallows
+    ValueErrors, which would turn an over-size file into a missing one.
+    """
+
+    def __str__(self):
+        return self.description
+
+
+class HashingSpool:
+    """
+    Writable spool file for one upload that hashes and counts the bytes as
+    they are written, so the finished upload never needs re-reading. Raises
+    UploadTooLarge as soon as more than `max_bytes` have been written.
+    Everything else (read, seek, close, ...) goes to the underlying file.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self._file = tempfile.NamedTemporaryFile(dir=directory, prefix="upload-", delete=False)
+        self.path = Path(self._file.name)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload is larger than {self.max_bytes // (1024 * 1024)}MB")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def discard(self):
+        """Close and delete the spool file unless it has been moved into the store."""
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadStore:
+    """
+    Files arrive already written and hashed (a HashingSpool, an assembled
+    resumable upload) and are renamed into their sharded location, so a
+    blob path never refers to a partial file. Uploading bytes that are
+    already stored costs one index row and no disk space.
+    """
+
+    def __init__(self, root, db_path=None):
+        self.root = Path(root)
+        self.incoming = self.root / ".incoming"
+        self.incoming.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(db_path or self.root / "index.sqlite")
+        self._init_lock = threading.Lock()
+        self._initialised = False
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with self._init_lock:
+                if not self._initialised:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS blobs ("
+                        " sha256 TEXT PRIMARY KEY, extension TEXT NOT NULL, size INTEGER NOT NULL,"
+                        " created_at REAL NOT NULL)"
+                    )
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS uploads ("
+                        " id INTEGER PRIMARY KEY AUTOINCREMENT, sha256 TEXT NOT NULL,"
+                        " filename TEXT NOT NULL, uploaded_at REAL NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS uploads_sha256 ON uploads (sha256)")
+                    self._initialised = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def blob_path(self, sha256, extension):
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}{extension}"
+
+    def adopt(self, temp_name, sha256, size, filename, extension):
+        """
+        Move an already-hashed file (e.g. a HashingSpool) into the store and
+        record the upload. The file is consumed: moved, or deleted if the
+        blob already exists.
+        """
+        path = self.blob_path(sha256, extension)
+        duplicate = path.exists()
+        if duplicate:
+            os.unlink(temp_name)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(temp_name, path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # Spooled on another filesystem: copy next to the blob first so the rename stays atomic
+                fd, staged = tempfile.mkstemp(dir=self.incoming)
+                os.close(fd)
+                shutil.move(temp_name, staged)
+                os.replace(staged, path)
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO blobs (sha256, extension, size, created_at) VALUES (?, ?, ?, ?)",
+                (sha256, extension, size, now),
+            )
+            conn.execute("INSERT INTO uploads (sha256, filename, uploaded_at) VALUES (?, ?, ?)",
+                         (sha256, filename, now))
+        return StoredUpload(sha256, path, size, duplicate)
+
+    def stats(self):
+        with self._connect() as conn:
+            blobs, stored = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            uploads, received = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM uploads JOIN blobs USING (sha256)").fetchone()
+        return {
+            "blobs": blobs,
+            "uploads": uploads,
+            "bytes_stored": stored,
+            "bytes_received": received,
+            "bytes_deduplicated": received - stored,
+        }